@@ -1,9 +1,27 @@
 #! /usr/bin/env python
 
-from bs4 import BeautifulSoup
-import requests
-import pandas as pd
+# bs4, pandas and asyncio are imported where they are used, so that the
+# scrapers start quickly when they do not need them.
+from html.parser import HTMLParser
 from collections import defaultdict
+import importlib
+import sys
+import threading
+from fetch import fetch, DEFAULT_TTL
+from instrument import span
+
+ENGINES = ("soup", "stream")
+CHUNK_SIZE = 64 * 1024
+# Maximum number of pages fetch_tables downloads at the same time.
+CONCURRENCY = 6
+# With keeptags="links", the first link in each cell of a column is stored
+# in a column named after it with this suffix.
+HREF_SUFFIX = "_href"
+# Tags whose text BeautifulSoup's get_text() leaves out, and so does the
+# stream engine.
+HIDDEN_TAGS = ("script", "style", "template")
+
+_import_lock = threading.Lock()
 
 class HTMLTableParser:
     """
@@ -12,55 +30,462 @@ class HTMLTableParser:
 
     Args:
         url (str): URL to parse.
-        keeptags (Bool): If True, raw tags from table will be stored in the
-            dataframe. This is useful if there is metainformation of interest
-            e.g. links.
+        keeptags (Bool or str): If True, raw tags from table will be stored in
+            the dataframe. This is useful if there is metainformation of
+            interest e.g. links. If "links", cells are stored as text, the
+            href of the first link in each cell goes in a separate
+            "<column>_href" column (for columns with any links), and the
+            soup is freed after parsing, so the tables only hold strings.
+        engine (str): "soup" builds a BeautifulSoup tree of the whole page.
+            "stream" feeds the page to an incremental parser which only
+            builds the table cells, which is much faster and lighter on
+            large pages. If keeptags is True, the stream engine restricts
+            the BeautifulSoup tree to <table> elements instead. The two
+            give the same tables for pages whose cells and rows are
+            closed and whose tables are not nested, but differ otherwise:
+            the stream engine closes <td>, <th> and <tr> at the next cell,
+            row or table end as browsers do, while BeautifulSoup's
+            html.parser builder nests them, and with header=True the
+            soup engine counts the cells of a nested table as rows of the
+            enclosing one.
+        ttl (float or None): Age in seconds after which a cached copy of the
+            page is revalidated, see fetch.fetch.
+        select (int, list, str, regex or callable): Which tables to parse,
+            all if None. Ints are positions among all tables of the page
+            (or among the css matches). Other selectors are matched
+            against a table's title, the whitespace-collapsed text of its
+            <caption> or else of its first row: a str must be a substring
+            of it, a compiled regex must search it and a callable is
+            called with it. Scanning stops once the requested tables are
+            found. Tables are returned in page order.
+        css (str): CSS selector restricting the candidate tables, e.g.
+            "table.poll". Soup engine only.
+        limit (int): Stop after this many matching tables.
+        header (Bool): If True, the first <th> cells are the column names
+            and only rows of <td> cells are kept. If False, every row is
+            kept, th and td cells alike, with integer column names; short
+            rows are padded with None.
+        html (str or bytes): Page source, instead of fetching url, see
+            from_html.
     """
-    def __init__(self, url, keeptags=False):
+    def __init__(self, url, keeptags=False, engine="soup", ttl=DEFAULT_TTL,
+                 select=None, css=None, limit=None, header=True, html=None):
+        if engine not in ENGINES:
+            raise ValueError("engine must be one of {}, got {}".format(ENGINES, engine))
+        if keeptags not in (True, False, "links"):
+            raise ValueError("keeptags must be True, False or 'links', got {}".format(keeptags))
+        if css is not None and engine == "stream":
+            raise ValueError("css selectors need the soup engine")
         self.url = url
         self._keeptags = keeptags
-        self.soup = self.soupify()
-        self.parse_tables()
-         
+        self._engine = engine
+        self._ttl = ttl
+        self._match, self._limit = _selector(select, limit)
+        self._css = css
+        self._header = header
+        self._html = html
+        # The first instance pays for the deferred imports; time them on
+        # their own rather than as part of parsing.
+        deferred = ["pandas"]
+        if engine == "soup" or keeptags is True:
+            deferred.append("bs4")
+        with _import_lock:
+            missing = [name for name in deferred if name not in sys.modules]
+            if missing:
+                with span("import", modules=missing):
+                    for name in missing:
+                        importlib.import_module(name)
+        with span("soupify", url=url, engine=engine):
+            self.soup = self.soupify()
+        with span("parse_tables", url=url, engine=engine):
+            self.parse_tables()
+        if keeptags == "links":
+            # Everything of interest is in the tables now.
+            self.soup = None
+        self._html = None
+
+    @classmethod
+    def from_html(cls, html, encoding=None, **kwargs):
+        """
+        Parse tables from page source already in hand, without touching
+        the network.
+
+        Args:
+            html (str or bytes): Page source.
+            encoding (str): Encoding of html if it is bytes, utf-8 if None.
+            **kwargs: Any other argument of HTMLTableParser.
+        """
+        if isinstance(html, bytes):
+            html = html.decode(encoding or "utf-8", errors="replace")
+        return cls(None, html=html, **kwargs)
+
     def soupify(self):
-        """ Parse URL. """
-        response = requests.get(self.url)
-        soup = BeautifulSoup(response.text, "html.parser")
+        """ Parse URL. For the stream engine without tags, no soup is built. """
+        if self._html is not None:
+            text = self._html
+        else:
+            text = fetch(self.url, ttl=self._ttl).text
+        if self._engine == "stream" and self._keeptags is not True:
+            self._chunks = (text[i:i+CHUNK_SIZE] for i in range(0, len(text), CHUNK_SIZE))
+            return None
+        from bs4 import BeautifulSoup, SoupStrainer
+        if self._engine == "stream":
+            # Tags have to live in a tree, but only the tables are needed.
+            return BeautifulSoup(text, "html.parser",
+                                 parse_only=SoupStrainer("table"))
+        soup = BeautifulSoup(text, "html.parser")
         return soup
 
     def parse_tables(self):
         """ Parse all HTML tables in the URL, storing header and row information. """
         self.tables = []
+        if self.soup is None:
+            tables = self._stream_tables()
+        else:
+            tables = self._soup_tables()
+        for colnames, rows in tables:
+            self.tables.append(self._to_dataframe(colnames, rows))
+
+    def _soup_tables(self):
+        """ Yield (column names, [(row index, cells)]) for each selected table in the soup. """
         # Get all tables
-        tables = self.soup.find_all("table")
-        for table in tables:
-            data = defaultdict(list)
+        if self._css is not None:
+            tables = self.soup.select(self._css)
+        else:
+            tables = self.soup.find_all("table")
+        found = 0
+        for index, table in enumerate(tables):
+            if found == self._limit:
+                break
             # Get all rows from the table
             rows = table.find_all("tr")
+            if not self._match(index, _soup_title(table, rows)):
+                continue
+            found += 1
             colnames = None
+            cells = []
             for i in range(len(rows)):
-                # If not already done, see if there is a table header 
-                # which contains column names
-                if colnames is None:
-                    header = rows[i].find_all("th")
-                    colnames = [col.get_text() for col in header if len(header) > 0]
-                cols = rows[i].find_all("td")
+                if not self._header:
+                    if rows[i].find_parent("table") is not table:
+                        # Row of a nested table
+                        continue
+                    cols = rows[i].find_all(["th", "td"], recursive=False)
+                else:
+                    # If not already done, see if there is a table header
+                    # which contains column names
+                    if colnames is None:
+                        header = rows[i].find_all("th")
+                        colnames = [col.get_text() for col in header if len(header) > 0]
+                    cols = rows[i].find_all("td")
                 # If the table row data is empty, it's likely the table heder, so skip.
                 if len(cols) != 0:
-                    if len(cols) != len(colnames):
-                        print("WARNING!")
-                        print("Number of columns in row {}, {}, does not match number of column names, {}".format(i, len(cols), len(colnames)))
-                        print("Skipping row for now...")
-                        continue
-                    # Storing data in a dictionary is the only way to retain bs4 tag
-                    # objects; np.arrays cannot handle them.
-                    for j in range(len(cols)):
-                        if self._keeptags is True:
-                            coldata = cols[j]
-                        else:
-                            coldata = cols[j].get_text()
-                        data[colnames[j]].append(coldata)
-            # Insert the table data in a dataframe and append to a list of tables.
-            df = pd.DataFrame(data=data)
-            self.tables.append(df)
-             
+                    if self._keeptags == "links":
+                        cols = [(col.get_text(), _first_href(col)) for col in cols]
+                    elif self._keeptags is not True:
+                        cols = [col.get_text() for col in cols]
+                    cells.append((i, cols))
+            yield colnames, cells
+
+    def _stream_tables(self):
+        """ Yield (column names, [(row index, cells)]) for each selected table in the stream. """
+        parser = _TableStream(links=self._keeptags == "links", header=self._header,
+                              match=self._match, limit=self._limit)
+        for chunk in self._chunks:
+            parser.feed(chunk)
+            if parser.done:
+                break
+        else:
+            parser.close()
+        del self._chunks
+        # A nested table in the first row of its parent is selected first.
+        for table in sorted(parser.selected, key=lambda table: table["index"]):
+            # Tables still open when scanning stopped are incomplete.
+            if table["closed"]:
+                yield table["colnames"], table["rows"]
+
+    def _to_dataframe(self, colnames, rows):
+        """ Insert the table data in a dataframe. """
+        import pandas as pd
+        data = defaultdict(list)
+        hrefs = defaultdict(list)
+        if not self._header:
+            ncols = max([len(cols) for i, cols in rows], default=0)
+            colnames = list(range(ncols))
+            empty = (None, None) if self._keeptags == "links" else None
+            rows = [(i, cols + [empty]*(ncols - len(cols))) for i, cols in rows]
+        for i, cols in rows:
+            if len(cols) != len(colnames):
+                print("WARNING!")
+                print("Number of columns in row {}, {}, does not match number of column names, {}".format(i, len(cols), len(colnames)))
+                print("Skipping row for now...")
+                continue
+            # Storing data in a dictionary is the only way to retain bs4 tag
+            # objects; np.arrays cannot handle them.
+            for j in range(len(cols)):
+                if self._keeptags == "links":
+                    data[colnames[j]].append(cols[j][0])
+                    hrefs[colnames[j]].append(cols[j][1])
+                else:
+                    data[colnames[j]].append(cols[j])
+        for colname, col in hrefs.items():
+            if any(href is not None for href in col):
+                data[str(colname) + HREF_SUFFIX] = col
+        return pd.DataFrame(data=data)
+
+#-----------------------------------------------------------------------------#
+async def fetch_tables(urls, concurrency=CONCURRENCY, workers=None,
+                       ttl=DEFAULT_TTL, **kwargs):
+    """
+    Fetch many pages concurrently and parse their tables in a process pool.
+    Downloads run in threads through fetch.fetch, at most concurrency at a
+    time, and each page is handed to a worker process as soon as it
+    arrives. Use as:
+
+        async for url, tables in fetch_tables(urls, engine="stream"):
+            ...
+
+    Args:
+        urls (iterable): URLs to parse.
+        concurrency (int): Maximum number of pages fetched at the same time.
+        workers (int or None): Number of parsing processes, one per CPU if
+            None.
+        ttl (float or None): Age in seconds after which a cached copy of a
+            page is revalidated, see fetch.fetch.
+        **kwargs: Any other argument of HTMLTableParser, which must be
+            picklable to reach the workers: a select predicate has to be a
+            module-level function, not a lambda. keeptags=True is not
+            supported, since bs4 tags cannot be sent back from the
+            workers; "links" keeps the hrefs as strings.
+    Yields:
+        url (str): URL of a parsed page, in order of completion.
+        tables (list): The page's tables, as HTMLTableParser.tables.
+    """
+    import asyncio
+    import pickle
+    from concurrent.futures import ProcessPoolExecutor
+    if kwargs.get("keeptags") is True:
+        raise ValueError("keeptags=True tables cannot leave the worker processes, use 'links'")
+    try:
+        pickle.dumps(kwargs)
+    except (pickle.PicklingError, AttributeError, TypeError) as e:
+        raise ValueError("HTMLTableParser arguments must be picklable to reach "
+                         "the worker processes: {}".format(e))
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    pool = ProcessPoolExecutor(max_workers=workers)
+
+    async def fetch_one(url):
+        async with semaphore:
+            response = await asyncio.to_thread(fetch, url, ttl=ttl)
+        tables = await loop.run_in_executor(pool, _parse_page, response.content,
+                                            response.encoding, kwargs)
+        return url, tables
+
+    tasks = [asyncio.ensure_future(fetch_one(url)) for url in urls]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        # Only left early if the caller stopped iterating or a page failed.
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Shutting down waits for the workers, so keep it off the loop.
+        await asyncio.to_thread(pool.shutdown, cancel_futures=True)
+
+def _parse_page(content, encoding, kwargs):
+    """ Parse the tables of one page. Runs in a worker process. """
+    return HTMLTableParser.from_html(content, encoding=encoding, **kwargs).tables
+
+def _first_href(tag):
+    """ href of the first link in a tag, or None. """
+    link = tag.find("a", href=True)
+    return link["href"] if link is not None else None
+
+def _soup_title(table, rows):
+    """ Text of a table's caption, or else of its first row. """
+    caption = table.find("caption")
+    if caption is not None:
+        return _collapse(caption.get_text())
+    if len(rows) != 0:
+        return _collapse(rows[0].get_text())
+    return ""
+
+def _collapse(text):
+    return " ".join(text.split())
+
+def _selector(select, limit=None):
+    """
+    Turn a table selector into a predicate on (table index, table title),
+    and the number of tables to find before scanning can stop (None for
+    no limit).
+    """
+    if select is None:
+        match = lambda index, title: True
+    elif isinstance(select, str):
+        match = lambda index, title: select in title
+    elif hasattr(select, "search"):
+        match = lambda index, title: select.search(title) is not None
+    elif callable(select):
+        match = lambda index, title: bool(select(title))
+    else:
+        indices = {select} if isinstance(select, int) else set(select)
+        if any(index < 0 for index in indices):
+            raise ValueError("table indices must not be negative, got {}".format(select))
+        match = lambda index, title: index in indices
+        limit = len(indices) if limit is None else min(limit, len(indices))
+    return match, limit
+
+#-----------------------------------------------------------------------------#
+class _TableStream(HTMLParser):
+    """
+    Incremental HTML parser which only keeps the text of table cells and,
+    if links is True, the href of the first link in each cell as well.
+    Tables are numbered in the order their start tags appear, like
+    BeautifulSoup's find_all("table"). Unclosed <td>, <th> and <tr> tags are
+    closed by the next cell, row or end of table. Nested tables are treated
+    as separate tables, although their text still counts towards the
+    enclosing cell.
+
+    Whether a table is kept is decided by match(index, title) as soon as
+    its title is known, at the end of its first row, and the rows of other
+    tables are dropped. Kept tables are listed in selected, in the order
+    they were kept, which puts a table nested in the first row of another
+    first; done turns True once limit of them are closed.
+    """
+    def __init__(self, links=False, header=True, match=None, limit=None):
+        super().__init__(convert_charrefs=True)
+        self.links = links
+        self.header = header
+        self.match = match if match is not None else (lambda index, title: True)
+        self.limit = limit
+        # Kept tables, in order.
+        self.selected = []
+        self.ntables = 0
+        self.nclosed = 0
+        # Currently open tables and cells, innermost last.
+        self._open = []
+        self._cells = []
+        # Depth inside tags whose text get_text() leaves out.
+        self._hidden = 0
+
+    @property
+    def done(self):
+        return self.limit is not None and self.nclosed >= self.limit
+
+    def handle_starttag(self, tag, attrs):
+        if tag in HIDDEN_TAGS:
+            self._hidden += 1
+        elif tag == "table":
+            table = {"index": self.ntables, "colnames": None, "rows": [],
+                     "nrows": 0, "row": None, "cell": None, "caption": None,
+                     "in_caption": False, "keep": None, "closed": False}
+            self.ntables += 1
+            self._open.append(table)
+        elif not self._open:
+            return
+        elif tag == "caption":
+            table = self._open[-1]
+            if table["caption"] is None:
+                table["caption"] = []
+                table["in_caption"] = True
+        elif tag == "tr":
+            table = self._open[-1]
+            self._end_row(table)
+            table["row"] = {"th": [], "td": [], "cells": [], "text": []}
+        elif tag == "a":
+            if self.links and self._cells and self._cells[-1]["href"] is None:
+                self._cells[-1]["href"] = dict(attrs).get("href")
+        elif tag in ("td", "th"):
+            table = self._open[-1]
+            self._end_cell(table)
+            if table["row"] is None:
+                table["row"] = {"th": [], "td": [], "cells": [], "text": []}
+            cell = {"text": [], "href": None}
+            table["row"][tag].append(cell)
+            table["row"]["cells"].append(cell)
+            table["cell"] = cell
+            self._cells.append(cell)
+
+    def handle_endtag(self, tag):
+        if tag in HIDDEN_TAGS:
+            self._hidden = max(self._hidden - 1, 0)
+            return
+        if not self._open:
+            return
+        table = self._open[-1]
+        if tag == "table":
+            self._end_table(self._open.pop())
+        elif tag == "caption":
+            table["in_caption"] = False
+        elif tag == "tr":
+            self._end_row(table)
+        elif tag in ("td", "th"):
+            self._end_cell(table)
+
+    def handle_data(self, data):
+        if self._hidden:
+            return
+        # Text belongs to every open cell, as with get_text() on nested tags.
+        for cell in self._cells:
+            cell["text"].append(data)
+        if self._open:
+            table = self._open[-1]
+            if table["in_caption"]:
+                table["caption"].append(data)
+            elif table["row"] is not None and table["nrows"] == 0:
+                table["row"]["text"].append(data)
+
+    def close(self):
+        super().close()
+        # Close any tables left open at the end of the document.
+        while self._open:
+            self._end_table(self._open.pop())
+
+    def _end_table(self, table):
+        self._end_row(table)
+        self._decide(table, "")
+        table["closed"] = True
+        if table["keep"]:
+            self.nclosed += 1
+
+    def _decide(self, table, title):
+        """ Keep or drop a table, once its title is known. """
+        if table["keep"] is None:
+            if table["caption"] is not None:
+                title = "".join(table["caption"])
+            full = self.limit is not None and len(self.selected) >= self.limit
+            table["keep"] = not full and self.match(table["index"], _collapse(title))
+            if table["keep"]:
+                self.selected.append(table)
+
+    def _end_cell(self, table):
+        if table["cell"] is not None:
+            cell = table["cell"]
+            self._cells = [c for c in self._cells if c is not cell]
+            table["cell"] = None
+
+    def _end_row(self, table):
+        self._end_cell(table)
+        row = table["row"]
+        if row is None:
+            return
+        self._decide(table, "".join(row["text"]))
+        if not table["keep"]:
+            table["nrows"] += 1
+            table["row"] = None
+            return
+        if not self.header:
+            cells = row["cells"]
+        else:
+            if table["colnames"] is None:
+                table["colnames"] = ["".join(col["text"]) for col in row["th"]]
+            cells = row["td"]
+        if len(cells) != 0:
+            if self.links:
+                cols = [("".join(col["text"]), col["href"]) for col in cells]
+            else:
+                cols = ["".join(col["text"]) for col in cells]
+            table["rows"].append((table["nrows"], cols))
+        table["nrows"] += 1
+        table["row"] = None
@@ -0,0 +1,88 @@
+"""
+Shared helpers for the benchmark scripts: a local stand-in HTTP server, so
+nothing touches the network, and simple timing/memory measurement.
+"""
+
+import functools
+import http.server
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# The scrapers are plain scripts at the top of the repository.
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO not in sys.path:
+    sys.path.insert(0, REPO)
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    # Artificial latency per request, in seconds.
+    delay = 0.
+
+    def do_GET(self):
+        if self.delay:
+            time.sleep(self.delay)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalServer:
+    """
+    Serve a directory over HTTP on localhost in a background thread.
+
+    Args:
+        direc (str): Directory to serve.
+        delay (float): Artificial latency added to every request, in
+            seconds, to stand in for a remote server.
+    """
+    def __init__(self, direc, delay=0.):
+        handler = type("_Handler", (_QuietHandler,), {"delay": delay})
+        handler = functools.partial(handler, directory=direc)
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def measure(func, repeat=3, setup=None):
+    """
+    Time a callable and trace its peak Python memory.
+
+    Args:
+        func (callable): Function to call with no arguments.
+        repeat (int): Number of timed calls; the best time is reported.
+        setup (callable or None): Called, untimed, before every call of
+            func, e.g. to restore files func modifies.
+    Returns:
+        result (dict): Best wall time in seconds and peak memory in bytes.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": min(times), "peak_bytes": peak}
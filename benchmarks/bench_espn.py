@@ -0,0 +1,45 @@
+#! /usr/bin/env python
+
+"""
+Time scrape_ncaa.parse_espn over a full season served from localhost with
+artificial per-request latency, serially and concurrently. The HTTP cache
+is disabled so every week is really fetched.
+
+Usage:
+    python benchmarks/bench_espn.py [--delay SECONDS] [--weeks N]
+"""
+
+import argparse
+import tempfile
+import time
+
+from _common import LocalServer
+from fixtures import write_espn_site
+import fetch
+import scrape_ncaa
+
+
+def main(delay, weeks):
+    fetch.CACHE_DIR = None
+    with tempfile.TemporaryDirectory() as direc:
+        write_espn_site(direc, "2017", weeks)
+        with LocalServer(direc, delay=delay) as server:
+            url = server.url + "/rankings"
+            results = {}
+            for concurrency in (1, scrape_ncaa.CONCURRENCY, weeks):
+                start = time.perf_counter()
+                espn_dict, season = scrape_ncaa.parse_espn(url, concurrency=concurrency)
+                elapsed = time.perf_counter() - start
+                results[concurrency] = espn_dict
+                print("concurrency {:>2}: {:.2f} s ({:.1f} round trips)".format(
+                      concurrency, elapsed, elapsed / delay))
+            assert all(d == results[1] for d in results.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--delay", type=float, default=0.2,
+                        help="Latency per request in seconds")
+    parser.add_argument("--weeks", type=int, default=18)
+    args = parser.parse_args()
+    main(args.delay, args.weeks)
@@ -0,0 +1,56 @@
+#! /usr/bin/env python
+
+"""
+Measure BwayData.plot_grosses render time and HTML size on a synthetic
+multi-year history, plotting every row (SVG) vs. the aggregated WebGL mode.
+
+Usage:
+    python benchmarks/bench_plot_grosses.py [--weeks N] [--shows N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import _common  # noqa: F401, puts the repository on sys.path
+from scrape_bway import BwayData
+
+
+def make_history(nweeks, nshows):
+    """ Weekly rows for every show over nweeks weeks. """
+    rng = np.random.default_rng(42)
+    n = nweeks * nshows
+    return pd.DataFrame({
+        "show": np.tile(["Show {}".format(i) for i in range(nshows)], nweeks),
+        "enddate": np.repeat(pd.date_range("2010-01-03", periods=nweeks, freq="7D"), nshows),
+        "gross": rng.integers(200000, 3000000, n),
+        "totalshows": rng.integers(7, 9, n)})
+
+
+def main(nweeks, nshows):
+    bway = BwayData(make_history(nweeks, nshows))
+    print("{} rows".format(len(bway.data)))
+    with tempfile.TemporaryDirectory() as direc:
+        for label, max_points in (("svg, all rows", np.inf),
+                                  ("webgl, aggregated", None)):
+            outfile = os.path.join(direc, "grosses.html")
+            kwargs = {} if max_points is None else {"max_points": max_points}
+            for plotlyjs in (True, "cdn"):
+                start = time.perf_counter()
+                bway.plot_grosses(outfile, auto_open=False,
+                                  include_plotlyjs=plotlyjs, **kwargs)
+                elapsed = time.perf_counter() - start
+                print("{:>18} (plotly.js {:>4}): {:.2f} s, {:.2f} MB".format(
+                      label, str(plotlyjs), elapsed, os.path.getsize(outfile) / 1e6))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weeks", type=int, default=520)
+    parser.add_argument("--shows", type=int, default=40)
+    args = parser.parse_args()
+    main(args.weeks, args.shows)
@@ -0,0 +1,74 @@
+#! /usr/bin/env python
+
+"""
+Measure how long the scrapers take to import, with python -X importtime in
+a fresh interpreter, and list the heaviest modules each one pulls in. The
+command line tools are run as frequent jobs, so this is paid on every run.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat N] [--top N]
+"""
+
+import argparse
+import subprocess
+import sys
+
+from _common import REPO
+
+MODULES = ["scrape_ncaa", "scrape_bway", "rename_photos", "HTMLTableParser"]
+
+
+def import_times(module):
+    """
+    Import a module in a fresh interpreter.
+
+    Returns:
+        times (list): (name, depth, cumulative seconds) of every module
+            imported, in the order -X importtime reports them.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                           "import {}".format(module)],
+                          cwd=REPO, capture_output=True, text=True, check=True)
+    times = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.append((name.strip(), depth, int(cumulative_us) / 1e6))
+    return times
+
+
+def import_time(module, repeat=5):
+    """
+    Returns:
+        total (float): Best cumulative import time of a module, in seconds.
+        times (list): import_times of the best run.
+    """
+    best = None
+    for _ in range(repeat):
+        times = import_times(module)
+        total = [t for name, depth, t in times if name == module][-1]
+        if best is None or total < best[0]:
+            best = (total, times)
+    return best
+
+
+def main(repeat, top):
+    for module in MODULES:
+        total, times = import_time(module, repeat)
+        print("{:<16} {:7.1f} ms".format(module, total * 1e3))
+        # The module's own imports are one level below it.
+        direct = [(t, name) for name, depth, t in times if depth == 1]
+        for t, name in sorted(direct, reverse=True)[:top]:
+            print("    {:<28} {:7.1f} ms".format(name, t * 1e3))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Imports per module; the fastest is reported")
+    parser.add_argument("--top", type=int, default=5,
+                        help="Number of heaviest imports listed per module")
+    args = parser.parse_args()
+    main(args.repeat, args.top)
@@ -0,0 +1,103 @@
+#! /usr/bin/env python
+
+"""
+Compare the "soup" and "stream" engines of HTMLTableParser on a synthetic
+multi-megabyte page served from localhost.
+
+Usage:
+    python benchmarks/bench_tableparser.py [--rows N]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+
+from _common import LocalServer, measure
+import fetch
+from HTMLTableParser import HTMLTableParser
+
+COLUMNS = ["Show", "Type", "Theatre", "Grosses", "Attend", "% Cap"]
+
+
+def make_page(nrows, ntables=3):
+    """ Build an HTML page with a few large tables surrounded by filler. """
+    filler = "<div class='nav'><a href='/x'>link</a> some text</div>\n" * 2000
+    parts = ["<html><head><title>bench</title></head><body>", filler]
+    header = "".join("<th>{}</th>".format(col) for col in COLUMNS)
+    for t in range(ntables):
+        parts.append("<table><thead><tr>{}</tr></thead><tbody>".format(header))
+        for i in range(nrows):
+            parts.append("<tr><td><a href='/show/{0}'>Show {0}</a></td>"
+                         "<td>Musical</td><td>Theatre {1}</td>"
+                         "<td>$1,{0:06d}</td><td>{0:,}</td><td>9{1}.5%</td></tr>"
+                         .format(i, t))
+        parts.append("</tbody></table>")
+        parts.append(filler)
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+# Small pages on which the engines must agree (True) or are documented to
+# differ (False), with the header argument to parse them with.
+ENGINE_CASES = [
+    ("<table><tr><th>A</th><th>B</th></tr><tr><td>1</td><td>2</td></tr></table>",
+     True, True),
+    ("<table><tr><th>A</th><th>B</th></tr><tr><td>1</td><td><table><tr>"
+     "<td>x</td><td>y</td></tr></table></td></tr><tr><td>3</td><td>4</td></tr></table>",
+     False, True),
+    ("<table><tr><td>1</td><td><table><tr><td>x</td></tr></table></td></tr></table>",
+     False, True),
+    # Omitted end tags, valid HTML5: html.parser nests the cells.
+    ("<table><tr><th>A<th>B<tr><td>1<td>2<tr><td>3<td>4</table>", True, False),
+    ("<table><tr><th>A<th>B<tr><td>1<td>2<tr><td>3<td>4</table>", False, False),
+    # Nested table with header=True: soup also takes its cells as rows.
+    ("<table><tr><th>A</th><th>B</th></tr><tr><td>1</td><td><table><tr>"
+     "<td>x</td><td>y</td></tr></table></td></tr><tr><td>3</td><td>4</td></tr></table>",
+     True, False),
+]
+
+
+def check_engines():
+    """ Check the engines agree, or differ, as the engine docstring says. """
+    for html, header, same in ENGINE_CASES:
+        with contextlib.redirect_stdout(io.StringIO()):
+            soup = HTMLTableParser.from_html(html, header=header).tables
+            stream = HTMLTableParser.from_html(html, engine="stream", header=header).tables
+        agree = len(soup) == len(stream) and all(a.equals(b) for a, b in zip(soup, stream))
+        assert agree == same, "Engines {} on {}".format("disagree" if same else "agree", html)
+
+
+def main(nrows):
+    fetch.CACHE_DIR = None
+    check_engines()
+    with tempfile.TemporaryDirectory() as direc:
+        page = make_page(nrows)
+        with open(os.path.join(direc, "page.html"), "w") as f:
+            f.write(page)
+        print("Page size: {:.1f} MB".format(len(page) / 1e6))
+        with LocalServer(direc) as server:
+            url = server.url + "/page.html"
+            soup = HTMLTableParser(url, engine="soup")
+            stream = HTMLTableParser(url, engine="stream")
+            for a, b in zip(soup.tables, stream.tables):
+                assert a.equals(b), "Engines disagree"
+            first = HTMLTableParser(url, engine="stream", select=0)
+            assert first.tables[0].equals(soup.tables[0]), "Selection disagrees"
+            for engine in ("soup", "stream"):
+                res = measure(lambda: HTMLTableParser(url, engine=engine))
+                print("{:>6}: {:.3f} s, peak {:.1f} MB".format(
+                      engine, res["seconds"], res["peak_bytes"] / 1e6))
+            # The first table only: scanning stops after it.
+            res = measure(lambda: HTMLTableParser(url, engine="stream", select=0))
+            print("{:>6}: {:.3f} s, peak {:.1f} MB (select=0)".format(
+                  "stream", res["seconds"], res["peak_bytes"] / 1e6))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000,
+                        help="Rows per table")
+    args = parser.parse_args()
+    main(args.rows)
@@ -0,0 +1,150 @@
+"""
+Synthetic stand-ins for the pages the scrapers read, laid out on disk so
+LocalServer serves them at the same paths as the real sites.
+"""
+
+import os
+
+TEAMS = ["Villanova", "Kansas", "Gonzaga", "Duke", "North Carolina",
+         "Kentucky", "Arizona", "Indiana", "Purdue", "Michigan State",
+         "Virginia", "Louisville", "UCLA", "Baylor", "Oregon", "Butler",
+         "Florida", "West Virginia", "Cincinnati", "Wisconsin", "SMU",
+         "Creighton", "Notre Dame", "Saint Mary's", "Xavier", "Maryland",
+         "Florida State", "Wichita State", "Iowa State", "Minnesota"]
+
+POLLS = ["AP Top 25", "USA Today Coaches Poll"]
+
+
+def espn_page(season, week, final_week=None):
+    """
+    HTML for one week of ESPN rankings. The ranking order rotates with the
+    week so teams move around the polls.
+
+    Args:
+        season (str): Year of the season.
+        week (int): Week of the page.
+        final_week (int or None): If set, the page is the current rankings
+            page and its header names this week.
+    """
+    header = "{} NCAA Basketball Rankings - Week {}".format(season, final_week or week)
+    parts = ["<html><body><h1>{}</h1>".format(header)]
+    for n, poll in enumerate(POLLS):
+        parts.append("<table><tr><td colspan='5'>{}</td></tr>".format(poll))
+        parts.append("<tr><td>RK</td><td>TEAM</td><td>REC</td>"
+                     "<td>PTS</td><td>TREND</td></tr>")
+        for rank in range(1, 26):
+            team = TEAMS[(rank + 2*week + n) % len(TEAMS)]
+            parts.append("<tr><td>{0}</td><td>{1} ({2})</td><td>{3}-{4}</td>"
+                         "<td>{5}</td><td>-</td></tr>"
+                         .format(rank, team, 26 - rank, week + rank, week,
+                                 1600 - 50*rank))
+        parts.append("</table>")
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def write_espn_site(direc, season, final_week, current=True):
+    """
+    Write a season of ESPN rankings pages under direc/rankings, so that
+    server.url + "/rankings" stands in for scrape_ncaa.ESPN_RANKINGS. The
+    season's landing page is written too, and with current=True (the
+    default) it is also the current rankings page.
+    """
+    root = os.path.join(direc, "rankings")
+    landing = os.path.join(root, "_", "year", str(season))
+    os.makedirs(landing, exist_ok=True)
+    pages = [landing, root] if current else [landing]
+    for page in pages:
+        with open(os.path.join(page, "index.html"), "w") as f:
+            f.write(espn_page(season, final_week, final_week))
+    for week in range(1, final_week + 1):
+        weekdir = os.path.join(root, "_", "year", str(season), "week", str(week))
+        os.makedirs(weekdir, exist_ok=True)
+        with open(os.path.join(weekdir, "index.html"), "w") as f:
+            f.write(espn_page(season, week))
+    return root
+
+
+BWAY_COLUMNS = ["Show", "Type", "Theatre", "Week End", "#Perf", "#Prev",
+                "% Cap", "Attend", "AttendPrev Week", "GG%GP", "Grosses",
+                "GrossesPrev Week"]
+
+
+def bway_page(week_end, nshows=35):
+    """
+    HTML for one week of Broadway League grosses.
+
+    Args:
+        week_end (datetime.date): Week-ending date of the page.
+        nshows (int): Number of shows (rows) in the table.
+    """
+    seed = week_end.toordinal()
+    header = "".join("<th>{}</th>".format(col) for col in BWAY_COLUMNS)
+    parts = ["<html><body><table><thead><tr>{}</tr></thead><tbody>".format(header)]
+    for i in range(nshows):
+        gross = 300000 + (seed * 7919 + i * 104729) % 2500000
+        prev = 300000 + (seed * 7907 + i * 104723) % 2500000
+        attend = 4000 + (seed + i * 37) % 9000
+        cells = ["<a href='/shows/show-{0}'>Show {0}</a>".format(i),
+                 "Musical" if i % 3 else "Play",
+                 "Theatre {}".format(i % 40),
+                 week_end.strftime("%m/%d/%Y"),
+                 str(8 - (i % 2)), str(i % 2),
+                 "{:.2f}%".format(50 + (seed + i) % 50),
+                 "{:,}".format(attend), "{:,}".format(attend - 100),
+                 "{:.2f}%".format(40 + (seed * 3 + i) % 60),
+                 "${:,}".format(gross), "${:,}".format(prev)]
+        parts.append("<tr>{}</tr>".format("".join("<td>{}</td>".format(c) for c in cells)))
+    parts.append("</tbody></table></body></html>")
+    return "\n".join(parts)
+
+
+def write_bway_site(direc, week_ends, nshows=35):
+    """
+    Write one grosses page per week under direc/grosses. Returns the
+    template to pass as scrape_bway's url_template once prefixed with the
+    server URL.
+    """
+    root = os.path.join(direc, "grosses")
+    os.makedirs(root, exist_ok=True)
+    for week_end in week_ends:
+        with open(os.path.join(root, "{:%Y-%m-%d}.html".format(week_end)), "w") as f:
+            f.write(bway_page(week_end, nshows))
+    return "/grosses/{:%Y-%m-%d}.html"
+
+
+def espn_season(season, nweeks=18):
+    """ parse_espn-shaped rankings for one season, without any HTML. """
+    espn_dict = {"ap": {}, "usa": {}}
+    for week in range(nweeks, 0, -1):
+        for n, poll in enumerate(espn_dict):
+            teams = [TEAMS[(rank + 2*week + n + int(season)) % len(TEAMS)]
+                     for rank in range(1, 26)]
+            espn_dict[poll][week] = {"rank": list(range(1, 26)),
+                                     "team": teams,
+                                     "record": ["0-0"] * 25}
+    return espn_dict
+
+
+def write_photo(filename, stamp):
+    """ Write a small JPEG with an EXIF DateTime tag of stamp (datetime). """
+    from PIL import Image
+
+    exif = Image.Exif()
+    exif[0x0132] = stamp.strftime("%Y:%m:%d %H:%M:%S")
+    Image.new("RGB", (16, 16), (200, 30, 30)).save(filename, exif=exif.tobytes())
+
+
+def write_photos(direc, nphotos, nstamps=None):
+    """
+    Write small JPEGs with EXIF DateTime tags. With nstamps < nphotos,
+    several photos share each timestamp, like burst shots.
+    """
+    import datetime
+
+    os.makedirs(direc, exist_ok=True)
+    nstamps = nstamps or nphotos
+    base = datetime.datetime(2019, 6, 1, 12, 0, 0)
+    for i in range(nphotos):
+        stamp = base + datetime.timedelta(seconds=i % nstamps)
+        write_photo(os.path.join(direc, "IMG_{:06d}.jpg".format(i)), stamp)
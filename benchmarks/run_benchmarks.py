@@ -0,0 +1,224 @@
+#! /usr/bin/env python
+
+"""
+Offline benchmark suite for the scrapers and rename_photos. Every page is
+served from localhost by LocalServer, built from the fixtures module at a
+size set by --scale, and the HTTP cache is disabled so the full path is
+measured. Results are written as JSON, one file per commit, so runs can
+be compared.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--scale N] [--compare OLD.json]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+from _common import REPO, LocalServer, measure
+import bench_startup
+import fixtures
+import fetch
+import rename_photos
+import scrape_bway
+import scrape_ncaa
+from HTMLTableParser import HTMLTableParser, fetch_tables
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def bench_tables(server, direc, scale):
+    """ HTMLTableParser on a large grosses page, with both engines. """
+    week = datetime.date(2019, 6, 2)
+    with open(os.path.join(direc, "big.html"), "w") as f:
+        f.write(fixtures.bway_page(week, nshows=2000 * scale))
+    url = server.url + "/big.html"
+    return {"parse_tables[soup]": measure(lambda: HTMLTableParser(url)),
+            "parse_tables[stream]": measure(lambda: HTMLTableParser(url, engine="stream"))}
+
+
+def bench_bway(server, direc, scale):
+    """ BwayData.from_url on a scaled week of grosses; fetch_tables and analytics on many weeks. """
+    week = datetime.date(2019, 6, 2)
+    with open(os.path.join(direc, "bway.html"), "w") as f:
+        f.write(fixtures.bway_page(week, nshows=500 * scale))
+    url = server.url + "/bway.html"
+    weeks = [week - datetime.timedelta(weeks=n) for n in range(8 * scale)]
+    template = server.url + fixtures.write_bway_site(direc, weeks)
+    urls = [template.format(w) for w in weeks]
+    root = os.path.join(direc, "bway_store")
+    scrape_bway.ingest(weeks, root, template)
+    bway = scrape_bway.BwayData.from_store(root)
+    analyze = lambda: (bway.summary(), bway.summary("theater"), bway.capacity_trend(),
+                       bway.rankings())
+    return {"BwayData.from_url": measure(lambda: scrape_bway.BwayData.from_url(url)),
+            "fetch_tables": measure(lambda: asyncio.run(_collect_tables(urls))),
+            "BwayData analytics": measure(analyze, setup=bway.invalidate),
+            "BwayData analytics[cached]": measure(analyze)}
+
+
+async def _collect_tables(urls):
+    return [item async for item in fetch_tables(urls, engine="stream", keeptags="links")]
+
+
+def bench_ncaa(server, direc, scale):
+    """ parse_espn over a fixture season, and compile_* on many seasons. """
+    fixtures.write_espn_site(direc, "2019", 18)
+    url = server.url + "/rankings"
+    espn_dict, season = scrape_ncaa.parse_espn(url)
+    seasons = {str(2000 + n): fixtures.espn_season(2000 + n) for n in range(10 * scale)}
+    return {"parse_espn": measure(lambda: scrape_ncaa.parse_espn(url)),
+            "compile_team_info": measure(lambda: scrape_ncaa.compile_team_info(espn_dict, season)),
+            "compile_seasons": measure(lambda: scrape_ncaa.compile_seasons(seasons))}
+
+
+def bench_plots(server, direc, scale):
+    """ plot_rank_v_week for a full season, rendered and unchanged. """
+    team_ranks = scrape_ncaa.compile_team_info(fixtures.espn_season(2019), "2019")
+    outdir = os.path.join(direc, "plots")
+    render = lambda: scrape_ncaa.plot_rank_v_week(team_ranks, "2019", True, outdir=outdir,
+                                                  workers=1, force=True, dpi=50)
+    unchanged = lambda: scrape_ncaa.plot_rank_v_week(team_ranks, "2019", True,
+                                                     outdir=outdir, workers=1, dpi=50)
+    return {"plot_rank_v_week": measure(render, repeat=1),
+            "plot_rank_v_week[unchanged]": measure(unchanged)}
+
+
+def check_renames(direc):
+    """
+    Regression checks for rename_photos: no photo may be lost or left
+    sharing a name with another, even on a case-insensitive filesystem.
+    """
+    stamp = datetime.datetime(2019, 6, 1, 12, 0, 0)
+    cases = {
+        # An offset shifts a name onto another file's current name.
+        "offset": ({"20190601_120000.jpg": stamp,
+                    "20190601_130000.jpg": stamp + datetime.timedelta(hours=1)}, 1),
+        # Photos sharing a timestamp, one of which already has the name.
+        "same_stamp": ({"20190601_120000.jpg": stamp, "a.jpg": stamp,
+                        "b.jpg": stamp}, None),
+        # Names differing only by the case of the extension.
+        "ext_case": ({"a.jpg": stamp, "c.JPG": stamp}, None),
+    }
+    for name, (photos, offset) in cases.items():
+        work = os.path.join(direc, "check_" + name)
+        os.makedirs(work)
+        for filename, when in photos.items():
+            fixtures.write_photo(os.path.join(work, filename), when)
+        plan = rename_photos.plan_renames(rename_photos.parse_direc(work),
+                                          offset=offset)
+        renamed = dict(plan)
+        final = [renamed.get(os.path.join(work, f), os.path.join(work, f))
+                 for f in photos]
+        folded = {path.casefold() for path in final}
+        assert len(folded) == len(photos), "{}: names clash: {}".format(name, final)
+        rename_photos.apply_renames(plan)
+        assert len(os.listdir(work)) == len(photos), "{}: photos lost".format(name)
+        shutil.rmtree(work)
+
+
+def bench_photos(server, direc, scale):
+    """ rename_files and find_duplicates on a directory of photos with burst duplicates. """
+    check_renames(direc)
+    original = os.path.join(direc, "photos_original")
+    work = os.path.join(direc, "photos")
+    fixtures.write_photos(original, 1000 * scale, nstamps=700 * scale)
+
+    def reset():
+        shutil.rmtree(work, ignore_errors=True)
+        shutil.copytree(original, work)
+
+    plan = lambda: rename_photos.plan_renames(rename_photos.parse_direc(work))
+    rename = lambda: rename_photos.rename_files(rename_photos.parse_direc(work))
+    dedupe = lambda: rename_photos.find_duplicates(rename_photos.parse_direc(work))
+    return {"plan_renames": measure(plan, setup=reset),
+            "rename_files": measure(rename, setup=reset),
+            "find_duplicates": measure(dedupe, setup=reset)}
+
+
+def bench_startup_time(server, direc, scale):
+    """ Import time of each script in a fresh interpreter. """
+    results = {}
+    for module in bench_startup.MODULES:
+        total, times = bench_startup.import_time(module)
+        results["import {}".format(module)] = {"seconds": total, "peak_bytes": 0}
+    return results
+
+
+BENCHMARKS = [bench_tables, bench_bway, bench_ncaa, bench_plots, bench_photos,
+              bench_startup_time]
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, old_file):
+    """ Print the time ratio of each benchmark against an older run. """
+    with open(old_file) as f:
+        old = json.load(f)["results"]
+    print("\n{:<30} {:>10} {:>10} {:>7}".format("benchmark", "old [s]", "new [s]", "ratio"))
+    for name, res in results.items():
+        if name not in old:
+            continue
+        ratio = res["seconds"] / old[name]["seconds"]
+        print("{:<30} {:>10.4f} {:>10.4f} {:>7.2f}".format(
+              name, old[name]["seconds"], res["seconds"], ratio))
+
+
+def main(scale, only=None, output=None, old_file=None):
+    fetch.CACHE_DIR = None
+    results = {}
+    with tempfile.TemporaryDirectory() as direc, LocalServer(direc) as server:
+        for bench in BENCHMARKS:
+            if only and not any(name in bench.__name__ for name in only):
+                continue
+            with contextlib.redirect_stdout(io.StringIO()):
+                res = bench(server, direc, scale)
+            for name, r in res.items():
+                print("{:<30} {:>9.4f} s {:>9.1f} MB".format(name, r["seconds"],
+                                                            r["peak_bytes"] / 1e6))
+            results.update(res)
+
+    commit = git_commit()
+    report = {"commit": commit,
+              "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "python": platform.python_version(),
+              "scale": scale,
+              "results": results}
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, "{}.json".format(commit))
+    with open(output, "w") as f:
+        json.dump(report, f, indent=1)
+    print("Wrote {}".format(output))
+    if old_file is not None:
+        compare(results, old_file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=int, default=1,
+                        help="Multiply the size of every fixture")
+    parser.add_argument("--only", nargs="*", default=None,
+                        help="Only run benchmarks whose name contains one of these")
+    parser.add_argument("-o", dest="output", default=None,
+                        help="Output JSON (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", dest="old_file", default=None,
+                        help="JSON of an earlier run to compare against")
+    args = parser.parse_args()
+    main(args.scale, args.only, args.output, args.old_file)
@@ -0,0 +1,173 @@
+#! /usr/bin/env python
+
+"""
+Shared HTTP layer for the scrapers. All requests go through one pooled
+keep-alive session, and successful responses are kept in an on-disk cache.
+A cached page younger than its TTL is served without touching the network;
+an older one is revalidated with If-None-Match/If-Modified-Since, so an
+unchanged page only costs a 304.
+
+The cache directory defaults to ~/.cache/fun and can be moved with the
+FUN_CACHE_DIR environment variable; setting it empty disables the cache.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrument import span, add_bytes, annotate
+
+CACHE_DIR = os.environ.get("FUN_CACHE_DIR",
+                           os.path.join(os.path.expanduser("~"), ".cache", "fun"))
+# Seconds before a cached page is revalidated. None means never revalidate,
+# which is appropriate for historical pages that cannot change.
+DEFAULT_TTL = 3600.
+POOL_SIZE = 16
+# Default number of retries on connection errors, timeouts and 5xx
+# responses, and the base of the exponential backoff between them.
+RETRIES = 3
+BACKOFF = 0.5
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """ Return the shared keep-alive session, creating it on first use. """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE,
+                                  pool_maxsize=POOL_SIZE)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+    return _session
+
+class CachedResponse:
+    """
+    The parts of a requests.Response the scrapers use, which can be
+    rebuilt from the cache.
+
+    Args:
+        url (str): Requested URL.
+        status_code (int): HTTP status code.
+        content (bytes): Response body.
+        encoding (str): Text encoding of the body.
+        headers (dict): Response headers; empty when served from the cache.
+        from_cache (Bool): True if the body was served from the cache,
+            including after a 304 revalidation.
+    """
+    def __init__(self, url, status_code, content, encoding, headers=None,
+                 from_cache=False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.encoding = encoding
+        self.headers = headers if headers is not None else {}
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+def fetch(url, ttl=DEFAULT_TTL, cache_dir=None, timeout=30,
+          retries=RETRIES, backoff=BACKOFF):
+    """
+    GET a URL through the shared session and the on-disk cache.
+
+    Args:
+        url (str): URL to get.
+        ttl (float or None): Age in seconds after which a cached copy is
+            revalidated. 0 always revalidates, None never does.
+        cache_dir (str, None or False): Cache directory. If None, CACHE_DIR
+            is used. If False (or CACHE_DIR is empty), the cache is bypassed
+            entirely.
+        timeout (float): Connect/read timeout in seconds.
+        retries (int): Number of retries on connection errors, timeouts
+            and 5xx responses.
+        backoff (float): Sleep backoff*2**n seconds before retry n.
+    Returns:
+        response (:obj:`CachedResponse`): The response.
+    """
+    with span("fetch", url=url, from_cache=False):
+        if cache_dir is None:
+            cache_dir = CACHE_DIR
+        if not cache_dir:
+            return _get(url, {}, timeout, retries, backoff)
+
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        body_file = os.path.join(cache_dir, key + ".body")
+        meta_file = os.path.join(cache_dir, key + ".json")
+        meta = _read_meta(meta_file, body_file)
+        if meta is not None:
+            age = time.time() - meta["fetched"]
+            if ttl is None or age < ttl:
+                return _from_cache(url, meta, body_file)
+
+        headers = {}
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        response = _get(url, headers, timeout, retries, backoff)
+
+        if response.status_code == 304 and meta is not None:
+            meta["fetched"] = time.time()
+            _write(meta_file, json.dumps(meta).encode("utf-8"))
+            return _from_cache(url, meta, body_file)
+        if response.status_code == 200:
+            meta = {"url": url,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "encoding": response.encoding,
+                    "fetched": time.time()}
+            os.makedirs(cache_dir, exist_ok=True)
+            # Body first, so a meta file always points at a complete body.
+            _write(body_file, response.content)
+            _write(meta_file, json.dumps(meta).encode("utf-8"))
+        return response
+
+#-----------------------------------------------------------------------------#
+def _get(url, headers, timeout, retries, backoff):
+    """ GET through the shared session with retries, as a CachedResponse. """
+    for attempt in range(retries + 1):
+        try:
+            r = get_session().get(url, headers=headers, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+        else:
+            if r.status_code < 500 or attempt == retries:
+                break
+        time.sleep(backoff * 2**attempt)
+    add_bytes(len(r.content))
+    return CachedResponse(url, r.status_code, r.content,
+                          r.encoding or r.apparent_encoding, r.headers)
+
+def _from_cache(url, meta, body_file):
+    annotate(from_cache=True)
+    with open(body_file, "rb") as f:
+        content = f.read()
+    return CachedResponse(url, 200, content, meta["encoding"], from_cache=True)
+
+def _read_meta(meta_file, body_file):
+    if not os.path.isfile(meta_file) or not os.path.isfile(body_file):
+        return None
+    try:
+        with open(meta_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write(filename, data):
+    """ Write atomically, so concurrent scrapers never see partial files. """
+    tmp = "{}.{}.{}.tmp".format(filename, os.getpid(), threading.get_ident())
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, filename)
@@ -0,0 +1,165 @@
+#! /usr/bin/env python
+
+"""
+Opt-in timing and memory instrumentation for the scrapers. Code marks its
+stages with named spans:
+
+    with span("soupify", url=url):
+        ...
+
+and the fetch layer reports the bytes it downloads to the enclosing spans.
+Open spans are kept per thread; a function passed to a worker thread
+through bind() counts toward the span open where it was bound, so bytes
+and peaks from the workers reach it.
+Each finished span records its wall time, bytes fetched and peak traced
+Python memory. Spans cost nothing unless instrumentation is enabled, either
+with enable() (the scripts' --profile flag) or by setting FUN_PROFILE to a
+report file, which is written at exit. Peak memory comes from tracemalloc,
+so it is approximate when spans overlap in several threads.
+"""
+
+import atexit
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+_enabled = False
+_report_file = None
+_spans = []
+_lock = threading.Lock()
+_local = threading.local()
+
+def enable(report_file=None):
+    """
+    Start recording spans.
+
+    Args:
+        report_file (str or None): If given, the report is written there
+            at exit. "-" writes it to stderr.
+    """
+    global _enabled, _report_file
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _enabled = True
+    if report_file is not None and _report_file is None:
+        atexit.register(_write_at_exit)
+    _report_file = report_file
+
+def enabled():
+    """ True if spans are being recorded. """
+    return _enabled
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """
+    Time a named stage.
+
+    Args:
+        name (str): Stage name, e.g. "soupify".
+        **attrs: Extra JSON-serializable information stored with the span.
+    """
+    if not _enabled:
+        yield
+        return
+    stack = _stack()
+    record = {"name": name, "peak_bytes": 0, "bytes_fetched": 0}
+    record.update(attrs)
+    tracemalloc.reset_peak()
+    start_mem = tracemalloc.get_traced_memory()[0]
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        stack.pop()
+        # reset_peak() in nested spans hides their peaks from this one, so
+        # children pass theirs up.
+        peak = tracemalloc.get_traced_memory()[1] - start_mem
+        record["peak_bytes"] = max(record["peak_bytes"], peak, 0)
+        with _lock:
+            if stack:
+                parent = stack[-1]
+                parent["peak_bytes"] = max(parent["peak_bytes"], record["peak_bytes"])
+                parent["bytes_fetched"] += record["bytes_fetched"]
+            _spans.append(record)
+
+def add_bytes(nbytes):
+    """ Count downloaded bytes against the innermost open span. """
+    if _enabled:
+        stack = _stack()
+        if stack:
+            with _lock:
+                stack[-1]["bytes_fetched"] += nbytes
+
+def annotate(**attrs):
+    """ Add information to the innermost open span, once it is known. """
+    if _enabled:
+        stack = _stack()
+        if stack:
+            stack[-1].update(attrs)
+
+def bind(func):
+    """
+    Wrap func, to be run in a worker thread, so that the spans it opens
+    and the bytes it fetches count toward the innermost span open now.
+    """
+    if not _enabled or not _stack():
+        return func
+    parent = _stack()[-1]
+
+    @functools.wraps(func)
+    def bound(*args, **kwargs):
+        stack = _stack()
+        stack.append(parent)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stack.pop()
+    return bound
+
+def report():
+    """
+    Returns:
+        report (dict): Every finished span, in order of completion, and
+            totals per span name.
+    """
+    with _lock:
+        spans = list(_spans)
+    totals = {}
+    for record in spans:
+        total = totals.setdefault(record["name"], {"count": 0, "seconds": 0.,
+                                                   "bytes_fetched": 0, "peak_bytes": 0})
+        total["count"] += 1
+        total["seconds"] += record["seconds"]
+        total["bytes_fetched"] += record["bytes_fetched"]
+        total["peak_bytes"] = max(total["peak_bytes"], record["peak_bytes"])
+    return {"spans": spans, "totals": totals}
+
+def write_report(report_file):
+    """ Write the report as JSON to a file, or to stderr for "-". """
+    if report_file == "-":
+        json.dump(report(), sys.stderr, indent=1, default=str)
+        sys.stderr.write("\n")
+        return
+    with open(report_file, "w") as f:
+        json.dump(report(), f, indent=1, default=str)
+
+#-----------------------------------------------------------------------------#
+def _stack():
+    """ Open spans of the current thread, innermost last. """
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def _write_at_exit():
+    if _enabled and _report_file is not None:
+        write_report(_report_file)
+
+if os.environ.get("FUN_PROFILE"):
+    enable(os.environ["FUN_PROFILE"])
@@ -0,0 +1,184 @@
+#! /usr/bin/env python
+
+'''
+Compact array representation of NCAA poll rankings: one int8 rank per
+(poll, team, week), with vectorized queries over it.
+'''
+
+import numpy as np
+
+# Rank stored for a team that is not ranked in a given poll and week.
+UNRANKED = 0
+POLLS = ("ap", "usa")
+
+#-----------------------------------------------------------------------------#
+#-----------------------------------------------------------------------------#
+
+class RankMatrix:
+    '''
+    Rankings as a (poll x team x week) int8 array. Ranks run from 1 to 25,
+    with UNRANKED marking weeks a team was not ranked. Week columns are
+    sorted by (season, week), so several seasons can share one matrix.
+
+    Parameters:
+    -----------
+        ranks : np.ndarray
+            int8 array of shape (len(polls), len(teams), number of weeks).
+        polls : tuple
+            Poll names, e.g. ("ap", "usa").
+        teams : np.ndarray
+            Sorted team names.
+        seasons : np.ndarray
+            Season of each week column.
+        weeks : np.ndarray
+            Week number of each week column.
+    '''
+
+    def __init__(self, ranks, polls, teams, seasons, weeks):
+        self.ranks = ranks
+        self.polls = tuple(polls)
+        self.teams = np.asarray(teams)
+        self.seasons = np.asarray(seasons)
+        self.weeks = np.asarray(weeks)
+        self._poll_index = {poll: i for i, poll in enumerate(self.polls)}
+        self._team_index = {team: i for i, team in enumerate(self.teams)}
+
+    @classmethod
+    def from_espn(cls, season_dicts, polls=POLLS):
+        '''
+        Build the matrix from parse_espn output.
+
+        Parameters:
+        -----------
+            season_dicts : dictionary
+                {season: espn_dict}, with espn_dict as returned by
+                parse_espn.
+            polls : tuple
+                Polls to include.
+
+        Returns:
+        --------
+            matrix : RankMatrix
+        '''
+        teams = set()
+        columns = set()
+        for season, espn_dict in season_dicts.items():
+            for poll in polls:
+                for week, week_data in espn_dict.get(poll, {}).items():
+                    columns.add((str(season), int(week)))
+                    teams.update(team for team, rank in
+                                 zip(week_data.get("team", []), week_data.get("rank", []))
+                                 if rank != 0)
+        teams = np.array(sorted(teams), dtype=str)
+        columns = sorted(columns)
+        column_index = {column: i for i, column in enumerate(columns)}
+
+        ranks = np.full((len(polls), len(teams), len(columns)), UNRANKED, dtype=np.int8)
+        for season, espn_dict in season_dicts.items():
+            for p, poll in enumerate(polls):
+                for week, week_data in espn_dict.get(poll, {}).items():
+                    week_ranks = np.asarray(week_data.get("rank", []))
+                    # "No rankings available" weeks are stored as rank 0.
+                    ranked = week_ranks != 0
+                    if not ranked.any():
+                        continue
+                    week_teams = np.asarray(week_data["team"], dtype=object)[ranked]
+                    t = np.searchsorted(teams, week_teams.astype(str))
+                    w = column_index[(str(season), int(week))]
+                    ranks[p, t, w] = week_ranks[ranked]
+        seasons = np.array([season for season, week in columns], dtype=str)
+        weeks = np.array([week for season, week in columns], dtype=int)
+        return cls(ranks, polls, teams, seasons, weeks)
+
+    def select_season(self, season):
+        '''
+        Returns:
+        --------
+            matrix : RankMatrix
+                Only the weeks of one season, and the teams ranked in it.
+        '''
+        cols = self.seasons == str(season)
+        ranks = self.ranks[:, :, cols]
+        rows = (ranks != UNRANKED).any(axis=(0, 2))
+        return RankMatrix(ranks[:, rows], self.polls, self.teams[rows],
+                          self.seasons[cols], self.weeks[cols])
+
+    def poll(self, poll):
+        ''' (team x week) rank array of one poll. '''
+        return self.ranks[self._poll_index[poll]]
+
+    def series(self, poll, team):
+        '''
+        Returns:
+        --------
+            weeks : np.ndarray
+                Weeks in which the team was ranked in the poll.
+            ranks : np.ndarray
+                The team's rank in those weeks.
+        '''
+        row = self.poll(poll)[self._team_index[team]]
+        ranked = row != UNRANKED
+        return self.weeks[ranked], row[ranked]
+
+    def ranked_teams(self, poll):
+        ''' Teams ranked at least once in the poll. '''
+        return self.teams[self.weeks_ranked(poll) > 0]
+
+    def weeks_ranked(self, poll):
+        ''' Number of weeks each team was ranked in the poll. '''
+        return (self.poll(poll) != UNRANKED).sum(axis=1)
+
+    def best_rank(self, poll):
+        ''' Best (lowest) rank of each team, UNRANKED if never ranked. '''
+        ranks = self.poll(poll)
+        best = np.where(ranks != UNRANKED, ranks, np.iinfo(np.int8).max).min(axis=1)
+        return np.where(best == np.iinfo(np.int8).max, UNRANKED, best).astype(np.int8)
+
+    def worst_rank(self, poll):
+        ''' Worst (highest) rank of each team, UNRANKED if never ranked. '''
+        return self.poll(poll).max(axis=1)
+
+    def moves(self, poll):
+        '''
+        Week-over-week change in rank, positive for a team moving up. Only
+        defined where the team is ranked in both weeks of the same season.
+
+        Returns:
+        --------
+            moves : np.ma.MaskedArray
+                (team x week-1) array, masked where undefined.
+        '''
+        ranks = self.poll(poll).astype(np.int16)
+        change = ranks[:, :-1] - ranks[:, 1:]
+        valid = ((ranks[:, :-1] != UNRANKED) & (ranks[:, 1:] != UNRANKED)
+                 & (self.seasons[:-1] == self.seasons[1:]))
+        return np.ma.masked_array(change, mask=~valid)
+
+    def biggest_moves(self, poll, n=10):
+        '''
+        Returns:
+        --------
+            moves : list
+                The n largest week-over-week moves, up or down, as
+                (team, season, week, change) with week the later week.
+        '''
+        moves = self.moves(poll)
+        size = np.abs(moves).filled(-1).ravel()
+        n = min(n, int((size >= 0).sum()))
+        order = np.argsort(size)[::-1][:n]
+        t, w = np.unravel_index(order, moves.shape)
+        return [(str(self.teams[i]), str(self.seasons[j+1]), int(self.weeks[j+1]),
+                 int(moves[i, j])) for i, j in zip(t, w)]
+
+    def disagreement(self, poll_a="ap", poll_b="usa"):
+        '''
+        Returns:
+        --------
+            diff : np.ma.MaskedArray
+                (team x week) rank in poll_a minus rank in poll_b, masked
+                unless the team is ranked in both.
+        '''
+        a = self.poll(poll_a).astype(np.int16)
+        b = self.poll(poll_b).astype(np.int16)
+        both = (a != UNRANKED) & (b != UNRANKED)
+        return np.ma.masked_array(a - b, mask=~both)
@@ -0,0 +1,159 @@
+#! /usr/bin/env python
+
+'''
+Persistent SQLite store of weekly NCAA Men's Basketball polls, keyed by
+(season, poll, week), so that scrape_ncaa only has to fetch the weeks it
+has not seen before.
+'''
+
+import sqlite3
+
+STORE_FILE = "ncaa_rankings.sqlite"
+KEYS = ["rank", "team", "record"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS weeks (
+    season TEXT NOT NULL,
+    week INTEGER NOT NULL,
+    PRIMARY KEY (season, week)
+);
+CREATE TABLE IF NOT EXISTS polls (
+    season TEXT NOT NULL,
+    poll TEXT NOT NULL,
+    week INTEGER NOT NULL,
+    row INTEGER NOT NULL,
+    rank,
+    team,
+    record,
+    PRIMARY KEY (season, poll, week, row)
+);
+"""
+
+#-----------------------------------------------------------------------------#
+#-----------------------------------------------------------------------------#
+
+class RankingStore:
+    '''
+    Weekly polls in the same shape parse_espn produces them, stored in a
+    SQLite file. A week is only recorded once both of its polls are stored,
+    so an interrupted run never leaves a partial week behind.
+
+    Parameters:
+    -----------
+        path : str
+            SQLite file, created if it does not exist.
+    '''
+
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def seasons(self):
+        '''
+        Returns:
+        --------
+            seasons : list
+                Seasons with at least one stored week, in order.
+        '''
+        rows = self.conn.execute("SELECT DISTINCT season FROM weeks ORDER BY season")
+        return [row[0] for row in rows]
+
+    def weeks(self, season, complete=False):
+        '''
+        Parameters:
+        -----------
+            season : str
+                Year of season.
+            complete : bool
+                If True, leave out weeks with a "No rankings available"
+                (rank 0) row, whose missing poll may have been published
+                since.
+
+        Returns:
+        --------
+            weeks : set
+                Weeks of the season that are already stored.
+        '''
+        season = str(season)
+        if complete:
+            rows = self.conn.execute(
+                "SELECT week FROM weeks WHERE season = ? AND week NOT IN "
+                "(SELECT week FROM polls WHERE season = ? AND rank = 0)",
+                (season, season))
+        else:
+            rows = self.conn.execute("SELECT week FROM weeks WHERE season = ?",
+                                     (season,))
+        return {row[0] for row in rows}
+
+    def put_week(self, season, week, polls):
+        '''
+        Store (or replace) the polls of one week.
+
+        Parameters:
+        -----------
+            season : str
+                Year of season.
+            week : int
+                Week of the polls.
+            polls : dictionary
+                {"ap": {"rank": [...], "team": [...], "record": [...]},
+                 "usa": ...}, as returned by scrape_ncaa.parse_polls.
+        '''
+        season = str(season)
+        week = int(week)
+        with self.conn:
+            self.conn.execute("DELETE FROM polls WHERE season = ? AND week = ?",
+                              (season, week))
+            for poll, columns in polls.items():
+                if not columns:
+                    continue
+                rows = zip(*[columns[key] for key in KEYS])
+                self.conn.executemany(
+                    "INSERT INTO polls VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(season, poll, week, i) + tuple(row) for i, row in enumerate(rows)])
+            self.conn.execute("INSERT OR REPLACE INTO weeks VALUES (?, ?)",
+                              (season, week))
+
+    def load(self, season, polls=("ap", "usa")):
+        '''
+        Read a season back in the shape of parse_espn's espn_dict.
+
+        Parameters:
+        -----------
+            season : str
+                Year of season.
+            polls : tuple
+                Polls to include.
+
+        Returns:
+        --------
+            espn_dict : dictionary
+                Dictionary describing rankings as a function of poll, with
+                weeks in descending order.
+        '''
+        season = str(season)
+        weeks = sorted(self.weeks(season), reverse=True)
+        espn_dict = {poll: {week: {} for week in weeks} for poll in polls}
+        rows = self.conn.execute(
+            "SELECT poll, week, rank, team, record FROM polls "
+            "WHERE season = ? ORDER BY poll, week, row", (season,))
+        for poll, week, rank, team, record in rows:
+            if poll not in espn_dict:
+                continue
+            columns = espn_dict[poll][week]
+            if not columns:
+                columns.update({key: [] for key in KEYS})
+            columns["rank"].append(rank)
+            columns["team"].append(team)
+            columns["record"].append(record)
+        return espn_dict
@@ -2,59 +2,170 @@
 
 from PIL import Image
 from PIL.ExifTags import TAGS
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
 import argparse
-import glob
+import hashlib
+import mmap
 import os
+import sqlite3
+
+import instrument
+from instrument import span
 import datetime
+import struct
+
+# TIFF tags read by read_exif_datetime.
+DATETIME_TAGS = {0x0132: "DateTime", 0x9003: "DateTimeOriginal"}
+EXIF_IFD_POINTER = 0x8769
+ASCII = 2
+# Default metadata index file, in the directory being renamed.
+INDEX_FILE = ".rename_photos.sqlite"
+# Photo file extensions parsed by parse_direc.
+EXTENSIONS = (".jpeg", ".jpg", ".png")
+# Leading bytes hashed to rule out most same-size files before a full hash.
+PARTIAL_HASH_SIZE = 64 * 1024
+DEDUPE_MODES = (None, "report", "skip")
 
-def parse_direc(direc):
+def parse_direc(direc, recursive=False, extensions=EXTENSIONS):
     """
-    Parse files in specified directory.
+    Parse files in specified directory, with a single os.scandir walk.
+    Extensions are matched case-insensitively, and files are yielded as
+    they are found, so metadata can be read while the walk continues.
 
     Args:
         direc (str): Directory where files reside. Supported filetypes: jpeg,
             png.
-    Returns:
-        files (array-like) Files to be renamed.
+        recursive (Bool): If True, also parse all subdirectories.
+        extensions (tuple): Lowercase file extensions to match.
+    Yields:
+        filename (str) Files to be renamed.
     """
     print("Working in directory {}".format(direc))
 
-    files = glob.glob(os.path.join(direc, "*jpeg")) + \
-            glob.glob(os.path.join(direc, "*jpg")) + \
-            glob.glob(os.path.join(direc, "*png")) + \
-            glob.glob(os.path.join(direc, "*JPEG")) + \
-            glob.glob(os.path.join(direc, "*JPG")) + \
-            glob.glob(os.path.join(direc, "*PNG"))
-
-    return files
+    direcs = [direc]
+    while direcs:
+        with os.scandir(direcs.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        direcs.append(entry.path)
+                elif entry.name.lower().endswith(extensions) and entry.is_file():
+                    yield entry.path
 
 def get_exif(filename):
     """ 
     Modified from code at:
     https://www.blog.pythonlibrary.org/2010/03/28/getting-photo-metadata-exif-using-python/
+
+    JPEGs are read with read_exif_datetime, which only looks at the EXIF
+    header. Other files, or JPEGs whose header it cannot read, fall back on
+    PIL, which decodes every tag.
     
     Args:
         filename (str): Pathname of file.
     Returns:
-        exif_info (dict): EXIF information.
+        exif_info (dict): EXIF information. From the fast path, only
+            DateTime and DateTimeOriginal.
     """
     
-    exif_info = {}
-    i = Image.open(filename)
-    info = i._getexif()
-    if info is None:
+    with span("get_exif", filename=filename):
+        exif_info = read_exif_datetime(filename)
+        if exif_info:
+            return exif_info
+
+        exif_info = {}
+        with Image.open(filename) as i:
+            info = i.getexif()
+            if info is None:
+                return None
+            tags = dict(info)
+            tags.update(info.get_ifd(EXIF_IFD_POINTER))
+        for tag, value in tags.items():
+            decoded = TAGS.get(tag, tag)
+            exif_info[decoded] = value
+        
+        return exif_info or None
+
+def read_exif_datetime(filename):
+    """
+    Read DateTime and DateTimeOriginal straight from the APP1/TIFF header
+    of a JPEG, without decoding the image or any other tag. Only the
+    leading segments of the file are read.
+
+    Args:
+        filename (str): Pathname of file.
+    Returns:
+        exif_info (dict or None): The datetime tags found, or None if the
+            file is not a JPEG or has no readable EXIF header.
+    """
+    with open(filename, "rb") as f:
+        if f.read(2) != b"\xff\xd8":
+            return None
+        while True:
+            segment = f.read(4)
+            if len(segment) < 4 or segment[0] != 0xFF:
+                return None
+            marker = segment[1]
+            length = struct.unpack(">H", segment[2:])[0]
+            # Start of scan or end of image: no EXIF header before the data.
+            if marker in (0xDA, 0xD9):
+                return None
+            if marker == 0xE1:
+                data = f.read(length - 2)
+                # APP1 may also hold XMP, so keep looking if it isn't EXIF.
+                if data[:6] == b"Exif\x00\x00":
+                    try:
+                        return _parse_tiff(data[6:])
+                    except (struct.error, IndexError, ValueError):
+                        return None
+            else:
+                f.seek(length - 2, os.SEEK_CUR)
+
+def _parse_tiff(tiff):
+    """ Get the datetime tags from IFD0 and the EXIF IFD of a TIFF header. """
+    order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if order is None:
         return None
-    for tag, value in info.items():
-        decoded = TAGS.get(tag, tag)
-        exif_info[decoded] = value
-    
+    exif_info = {}
+    ifd0 = struct.unpack(order + "I", tiff[4:8])[0]
+    exif_ifd = _read_ifd(tiff, order, ifd0, exif_info)
+    if exif_ifd is not None:
+        _read_ifd(tiff, order, exif_ifd, exif_info)
     return exif_info
 
+def _read_ifd(tiff, order, offset, exif_info):
+    """
+    Store the datetime tags of one IFD in exif_info, and return the offset
+    of the EXIF IFD if this IFD points to one.
+    """
+    pointer = None
+    count = struct.unpack(order + "H", tiff[offset:offset+2])[0]
+    for n in range(count):
+        entry = offset + 2 + 12*n
+        tag, kind, size = struct.unpack(order + "HHI", tiff[entry:entry+8])
+        if tag == EXIF_IFD_POINTER:
+            pointer = struct.unpack(order + "I", tiff[entry+8:entry+12])[0]
+        elif tag in DATETIME_TAGS and kind == ASCII:
+            # Values of up to 4 bytes are stored in the entry itself.
+            if size <= 4:
+                value = tiff[entry+8:entry+8+size]
+            else:
+                start = struct.unpack(order + "I", tiff[entry+8:entry+12])[0]
+                value = tiff[start:start+size]
+            exif_info[DATETIME_TAGS[tag]] = value.rstrip(b"\x00").decode("ascii")
+    return pointer
+
 def rename_files(files, in_format="%Y:%m:%d %H:%M:%S", 
                  out_format="%Y%m%d_%H%M%S", 
-                 offset=None):
+                 offset=None, workers=None, dry_run=False, index=None,
+                 dedupe=None):
     """
-    Rename photo filenames to reflect their datetime.
+    Rename photo filenames to reflect their datetime. The full mapping is
+    planned first (see plan_renames) and then applied in one pass.
+    Optionally, byte-identical copies are found first (see
+    find_duplicates); the first of each set in sorted order is the
+    original.
 
     Args:
         files (array-liked): Files to be renamed.
@@ -64,11 +175,77 @@ def rename_files(files, in_format="%Y:%m:%d %H:%M:%S",
             datetime.datetime noemnclature.
         offset (float or None): If not None, an offset, in hours,
             to apply to the datetime filename.
+        workers (int or None): Number of threads reading metadata.
+        dry_run (Bool): If True, only print the planned renames.
+        index (:obj:`MetadataIndex` or None): Index of already read
+            metadata, so unchanged files are not read again.
+        dedupe (str or None): "report" prints the duplicates and still
+            renames them, "skip" prints them and leaves them out of the
+            renaming. None does not look for duplicates.
     Returns:
         None
     """
 
-    for item in files:
+    if dedupe not in DEDUPE_MODES:
+        raise ValueError("dedupe must be one of {}, got {}".format(DEDUPE_MODES, dedupe))
+    if dedupe is not None:
+        files = list(files)
+        skip = set()
+        action = "Skipping" if dedupe == "skip" else "Found"
+        for group in find_duplicates(files, workers):
+            for item in group[1:]:
+                print("\t{} duplicate {} of {}".format(action, os.path.basename(item),
+                                                      os.path.basename(group[0])))
+                skip.add(item)
+        if dedupe == "skip":
+            files = [item for item in files if item not in skip]
+    plan = plan_renames(files, in_format, out_format, offset, workers, index)
+    apply_renames(plan, dry_run, index)
+
+def plan_renames(files, in_format="%Y:%m:%d %H:%M:%S",
+                 out_format="%Y%m%d_%H%M%S",
+                 offset=None, workers=None, index=None):
+    """
+    Read the metadata of all files in parallel and work out every new
+    name up front. With an index, only files that are new or modified
+    since they were indexed are read. Files sharing a timestamp get the suffixes _2, _3, ...
+    in sorted order of their current names, and no new name clashes with
+    another new name or with a file that is not being renamed.
+
+    Args:
+        files (array-liked): Files to be renamed.
+        in_format (str): Input photo's EXIF DateTime format in
+            datetime.datetime nomenclature.
+        out_format (str): Renamed output photo's name format in 
+            datetime.datetime noemnclature.
+        offset (float or None): If not None, an offset, in hours,
+            to apply to the datetime filename.
+        workers (int or None): Number of threads reading metadata.
+        index (:obj:`MetadataIndex` or None): Index of already read
+            metadata.
+    Returns:
+        plan (list): (current name, new name) pairs.
+    """
+
+    infos = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for item in files:
+            if index is not None:
+                found, exif_info = index.lookup(item)
+                if found:
+                    infos.append((item, exif_info))
+                    continue
+            futures.append(pool.submit(_read_exif, item))
+        fresh = [future.result() for future in futures]
+    if index is not None:
+        for item, exif_info in fresh:
+            index.update(item, exif_info)
+        index.commit()
+    infos.extend(fresh)
+
+    targets = []
+    for item, exif_info in sorted(infos, key=lambda info: info[0]):
         filename = os.path.basename(item)
         file_noext = filename.split(".")[0]
         # Sometimes the file format is already what we want.
@@ -78,28 +255,251 @@ def rename_files(files, in_format="%Y:%m:%d %H:%M:%S",
 #        except:
 #            pass
         
-        exif_info = get_exif(item)
-        
         # In case the file doesn't have the necessary data.
         if exif_info is None:
             print("\tERROR: Cannot get EXIF info for {}".format(filename))
             continue
         
-        p_date = exif_info["DateTime"]
-        p_dt = datetime.datetime.strptime(p_date, in_format)
+        p_date = exif_info.get("DateTime", exif_info.get("DateTimeOriginal"))
+        if p_date is None:
+            print("\tERROR: No DateTime in EXIF info for {}".format(filename))
+            continue
+        try:
+            p_dt = datetime.datetime.strptime(p_date, in_format)
+        except ValueError:
+            print("\tERROR: Cannot parse DateTime {} for {}".format(p_date, filename))
+            continue
         if offset is not None:
             p_dt += datetime.timedelta(hours=offset)
         out_name = p_dt.strftime(out_format)
-        out_file = item.replace(file_noext, out_name)
-        # These shouldn't happen, but just in case.
-        if out_file == item:
+        ext = filename[len(file_noext):]
+        targets.append((item, os.path.dirname(item), out_name, ext))
+
+    # Files which already have their name keep it, and reserve it. Names
+    # are compared case-folded, as on a case-insensitive filesystem.
+    keep = frozenset(item for item, direc, out_name, ext in targets
+                     if os.path.join(direc, out_name+ext) == item)
+    taken = {_fold(item) for item in keep}
+    # The current names of the other files are free, unless taken below.
+    # A file ending up with its own name has reserved it in taken first,
+    # so no other file can have been given it.
+    moving = {_fold(item) for item, direc, out_name, ext in targets} - taken
+    plan = []
+    for item, direc, out_name, ext in targets:
+        if item in keep:
             continue
-        if os.path.isfile(out_file):
-            out_file = item.replace(file_noext, out_name+"_2")
+        out_file = os.path.join(direc, out_name+ext)
+        n = 1
+        while (_fold(out_file) in taken or
+               (os.path.exists(out_file) and _fold(out_file) not in moving)):
+            n += 1
+            out_file = os.path.join(direc, "{}_{}{}".format(out_name, n, ext))
+        taken.add(_fold(out_file))
+        if out_file != item:
+            plan.append((item, out_file))
+    return plan
+
+def apply_renames(plan, dry_run=False, index=None):
+    """
+    Apply a plan from plan_renames. If a new name is the current name of
+    another file in the plan, every file is first moved to a temporary
+    name, so nothing is overwritten whatever the order. A new name held
+    by any other file raises FileExistsError before anything is renamed.
+
+    Args:
+        plan (list): (current name, new name) pairs.
+        dry_run (Bool): If True, only print the planned renames.
+        index (:obj:`MetadataIndex` or None): Index to record the new names
+            in.
+    Returns:
+        None
+    """
 
-        os.rename(item, out_file)
-        print("\tRenamed {} -> {}".format(filename,
+    if dry_run:
+        for item, out_file in plan:
+            print("\tWould rename {} -> {}".format(os.path.basename(item),
+                                                   os.path.basename(out_file)))
+        return
+
+    sources = {_fold(item) for item, out_file in plan}
+    for item, out_file in plan:
+        if _fold(out_file) not in sources and _occupied(item, out_file):
+            raise FileExistsError("Not renaming {} over existing {}".format(
+                                  item, out_file))
+    if any(_fold(out_file) in sources for item, out_file in plan):
+        staged = []
+        for item, out_file in plan:
+            tmp = os.path.join(os.path.dirname(item),
+                               ".{}.renaming".format(os.path.basename(item)))
+            os.rename(item, tmp)
+            # Index entries move with their files, so no entry is moved
+            # onto a path another entry still holds.
+            if index is not None:
+                index.renamed(item, tmp)
+            staged.append((item, tmp, out_file))
+    else:
+        staged = [(item, item, out_file) for item, out_file in plan]
+
+    for item, src, out_file in staged:
+        if _occupied(src, out_file):
+            raise FileExistsError("Not renaming {} over existing {}".format(
+                                  item, out_file))
+        with span("os.rename", filename=out_file):
+            os.rename(src, out_file)
+        print("\tRenamed {} -> {}".format(os.path.basename(item),
                                         os.path.basename(out_file)))
+        if index is not None:
+            index.renamed(src, out_file)
+    if index is not None:
+        index.commit()
+
+def _fold(path):
+    """ Path as compared on a case-insensitive filesystem. """
+    return os.path.normcase(path).casefold()
+
+def _occupied(src, out_file):
+    """ True if out_file exists and is not src under another case. """
+    return os.path.exists(out_file) and not os.path.samefile(src, out_file)
+
+class MetadataIndex:
+    """
+    On-disk SQLite index of the DateTime read from each file, keyed by
+    (path, size, mtime, inode), with the last name rename_files gave it.
+    A file whose size, mtime or inode changed is read again. Renaming
+    keeps all three, so renamed files stay indexed under their new path.
+
+    Args:
+        path (str): SQLite file, created if it does not exist.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS files ("
+                          "path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, "
+                          "inode INTEGER, datetime TEXT, name TEXT)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def lookup(self, item):
+        """
+        Args:
+            item (str): Pathname of file.
+        Returns:
+            found (Bool): True if the file is indexed and unchanged.
+            exif_info (dict or None): Indexed EXIF DateTime, None if the
+                file has none.
+        """
+        st = os.stat(item)
+        row = self.conn.execute("SELECT size, mtime, inode, datetime FROM files "
+                                "WHERE path = ?", (os.path.abspath(item),)).fetchone()
+        if row is None or tuple(row[:3]) != (st.st_size, st.st_mtime_ns, st.st_ino):
+            return False, None
+        if row[3] is None:
+            return True, None
+        return True, {"DateTime": row[3]}
+
+    def update(self, item, exif_info):
+        """ Index the EXIF DateTime of a file, which may be None. """
+        st = os.stat(item)
+        p_date = None
+        if exif_info is not None:
+            p_date = exif_info.get("DateTime", exif_info.get("DateTimeOriginal"))
+        self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, NULL)",
+                          (os.path.abspath(item), st.st_size, st.st_mtime_ns,
+                           st.st_ino, p_date))
+
+    def renamed(self, item, out_file):
+        """
+        Move a file's entry to its new name, replacing any stale entry
+        left there by a file since deleted or renamed outside this index.
+        """
+        self.conn.execute("DELETE FROM files WHERE path = ?",
+                          (os.path.abspath(out_file),))
+        self.conn.execute("UPDATE files SET path = ?, name = ? WHERE path = ?",
+                          (os.path.abspath(out_file), os.path.basename(out_file),
+                           os.path.abspath(item)))
+
+def find_duplicates(files, workers=None):
+    """
+    Find byte-identical files. Files are grouped by size, then by a hash of
+    their first PARTIAL_HASH_SIZE bytes, and only files still sharing a
+    group are hashed in full. Files are read through mmap, and hashed
+    in a thread pool, since hashlib releases the GIL on large buffers.
+    Unreadable files are never reported as duplicates.
+
+    Args:
+        files (array-liked): Files to compare.
+        workers (int or None): Number of threads hashing files.
+    Returns:
+        duplicates (list): Sorted lists of identical files, one list per
+            set of two or more. In sorted order, so the first file of
+            each set can be kept as the original.
+    """
+    files = list(files)
+    with span("find_duplicates", files=len(files)):
+        sizes = {}
+        by_size = defaultdict(list)
+        for item in files:
+            try:
+                sizes[item] = os.path.getsize(item)
+            except OSError:
+                continue
+            by_size[sizes[item]].append(item)
+        groups = [group for group in by_size.values() if len(group) > 1]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            groups = _split_by_hash(pool, groups, PARTIAL_HASH_SIZE)
+            # Files no longer than the partial hash are already fully hashed.
+            small = [group for group in groups if sizes[group[0]] <= PARTIAL_HASH_SIZE]
+            large = [group for group in groups if sizes[group[0]] > PARTIAL_HASH_SIZE]
+            groups = small + _split_by_hash(pool, large, None)
+    return sorted(sorted(group) for group in groups)
+
+def _split_by_hash(pool, groups, limit):
+    """ Split groups of files by the hash of their first limit bytes. """
+    items = [item for group in groups for item in group]
+    hashes = dict(pool.map(_hash_file, items, [limit]*len(items)))
+    split = []
+    for group in groups:
+        by_hash = defaultdict(list)
+        for item in group:
+            if hashes[item] is not None:
+                by_hash[hashes[item]].append(item)
+        split.extend(same for same in by_hash.values() if len(same) > 1)
+    return split
+
+def _hash_file(item, limit=None):
+    """
+    Hash a file, or its first limit bytes, through mmap. Runs in a worker
+    thread.
+    """
+    try:
+        with open(item, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # Empty files cannot be mapped.
+                return item, hashlib.sha1().hexdigest()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                data = m if limit is None else m[:limit]
+                return item, hashlib.sha1(data).hexdigest()
+    except (OSError, ValueError):
+        return item, None
+
+def _read_exif(item):
+    """ Read one file's EXIF info. Runs in a worker thread. """
+    try:
+        return item, get_exif(item)
+    except OSError:
+        return item, None
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -109,7 +509,35 @@ if __name__ == "__main__":
                         help="Input photo's EXIF DateTime format")
     parser.add_argument("-o", dest="out_format", default="%Y%m%d_%H%M%S",
                         help="Renamed output photo's name format")
+    parser.add_argument("-r", dest="recursive", action="store_true",
+                        help="Also rename files in all subdirectories")
+    parser.add_argument("-j", dest="workers", type=int, default=None,
+                        help="Number of threads reading metadata")
+    parser.add_argument("-n", "--dry-run", dest="dry_run", action="store_true",
+                        help="Print the planned renames without renaming")
+    parser.add_argument("--profile", default=None, metavar="REPORT",
+                        help="Record per-stage timing and memory, and write "
+                        "a JSON report to REPORT (- for stderr)")
+    parser.add_argument("--index", default=None,
+                        help="Metadata index file, so unchanged files are not "
+                        "read again (default: DIREC/{})".format(INDEX_FILE))
+    parser.add_argument("--no-index", dest="use_index", action="store_false",
+                        help="Read the metadata of every file")
+    parser.add_argument("--dedupe", choices=["report", "skip"], default=None,
+                        help="Find byte-identical files first, and either "
+                        "report them or leave them out of the renaming")
     args = parser.parse_args()
+    if args.profile is not None:
+        instrument.enable(args.profile)
     
-    files = parse_direc(args.direc)
-    rename_files(files, args.in_format, args.out_format)
+    files = parse_direc(args.direc, args.recursive)
+    if args.use_index:
+        index_file = args.index or os.path.join(args.direc, INDEX_FILE)
+        with MetadataIndex(index_file) as index:
+            rename_files(files, args.in_format, args.out_format,
+                         workers=args.workers, dry_run=args.dry_run, index=index,
+                         dedupe=args.dedupe)
+    else:
+        rename_files(files, args.in_format, args.out_format,
+                     workers=args.workers, dry_run=args.dry_run,
+                     dedupe=args.dedupe)
@@ -1,25 +1,97 @@
 #! /usr/bin/env python
 
-from HTMLTableParser import HTMLTableParser
+"""
+Scrape weekly Broadway grosses from the Broadway League into a Parquet
+store, and plot them.
+
+Usage:
+    python scrape_bway.py fetch
+    python scrape_bway.py ingest --start 2019-01-06 --end 2019-06-30
+    python scrape_bway.py plot [--start ...] [--end ...] [-o grosses.html]
+
+plotly is only imported when plotting. pandas, which every command needs,
+is imported up front, and brings numpy with it.
+"""
+
+from HTMLTableParser import HTMLTableParser, HREF_SUFFIX
+from fetch import DEFAULT_TTL
+import instrument
+from instrument import span
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-import plotly.graph_objects as go
-import numpy as np
+from urllib.parse import urljoin
+import argparse
+import os
+import pandas as pd
 
-BWAY_LEAGUE = "https://www.broadwayleague.com/research/grosses-broadway-nyc"
+BWAY_SITE = "https://www.broadwayleague.com"
+BWAY_LEAGUE = BWAY_SITE + "/research/grosses-broadway-nyc"
+# Grosses of one past week, formatted with its week-ending date.
+BWAY_WEEK_URL = BWAY_LEAGUE + "?week_ending={:%Y-%m-%d}"
+# Week-partitioned Parquet store written by ingest.
+STORE_DIR = "bway_grosses"
+PARTITION = "enddate={:%Y-%m-%d}"
+PART_FILE = "part.parquet"
+# Maximum number of weeks fetched at the same time.
+CONCURRENCY = 6
+# Largest number of rows plot_grosses draws without aggregating.
+MAX_SVG_POINTS = 2000
+
+# Column name on the Broadway League page -> (column name in BwayData.data,
+# type). The types are the keys of CONVERTERS.
+COLUMN_SCHEMA = {"#Perf": ("nshows", "int"),
+                 "#Prev": ("nprevs", "int"),
+                 "% Cap": ("capacity", "percent"),
+                 "Attend": ("nsold", "thousands"),
+                 "AttendPrev Week": ("nsold_previous", "thousands"),
+                 "GG%GP": ("perc_gp", "percent"),
+                 "Grosses": ("gross", "currency"),
+                 "GrossesPrev Week": ("gross_previous", "currency"),
+                 "Show": ("show", "text"),
+                 "Theatre": ("theater", "text"),
+                 "Type": ("showtype", "text"),
+                 "Week End": ("enddate", "date")}
 
 class BwayData:
     """
     A way to handle the data from Broadway League statistics.
-    For now the only attribute is data, but more will be added.
+    The data can also be loaded lazily, on first access, from a loader.
+
+    The analysis methods (weekly, summary, capacity_trend, rankings) are
+    memoized, and the memo is cleared whenever data is set or loaded, or
+    changes shape. Their results are shared between calls, so treat them
+    as read-only, and call invalidate() after modifying data in place.
 
     Args:
         df (:obj:`pandas.DataFrame`): dataframe containing show statistics.
+        loader (callable): Function returning the dataframe, used if df is
+            None.
     """
-    def __init__(self, df):
-        self.data = df
+    def __init__(self, df=None, loader=None):
+        self._data = df
+        self._loader = loader
+        self._cache = {}
+        self._key = None
+
+    @property
+    def data(self):
+        if self._data is None and self._loader is not None:
+            self._data = self._loader()
+            self._cache = {}
+        return self._data
+
+    @data.setter
+    def data(self, df):
+        self._data = df
+        self._loader = None
+        self._cache = {}
+
+    def invalidate(self):
+        """ Forget memoized results, e.g. after modifying data in place. """
+        self._cache = {}
 
     @classmethod
-    def from_url(cls, url=BWAY_LEAGUE):
+    def from_url(cls, url=BWAY_LEAGUE, ttl=DEFAULT_TTL):
         """
         Instantiate the class by parsing the data directly from the
         Broadway League website. All modifications to HTML data are done
@@ -27,97 +99,427 @@ class BwayData:
 
         Args: 
             url (str): URL to parse.
+            ttl (float or None): Age in seconds after which a cached copy
+                of the page is revalidated, see fetch.fetch.
         """
-        H = HTMLTableParser(url, keeptags=True)
+        H = HTMLTableParser(url, keeptags="links", ttl=ttl)
         assert len(H.tables) == 1, "API of URL changed, expected one table, got {}".format(len(H.tables))
         df = H.tables[0]
-        for colname in df.columns:
-            if colname == "Show":
-                col = [row.get_text() for row in df[colname]]
-                df[colname] = col
-    # Not sure how to do this yet
-    #            col = df[colname]
-    #            get_link_df(col)
-                continue
-            else:
-                col = [row.get_text() for row in df[colname]]
-                df[colname] = col
-            
-            if colname in ["#Perf", "#Prev"]:
-                df[colname] = df[colname].astype(int)
-            elif colname in ["% Cap", "GG%GP"]:
-                df[colname] = removechar(col, "%")
-                df[colname] = df[colname].astype(float)
-                df[colname] = df[colname]/100.
-            elif colname in ["Attend", "AttendPrev Week"]:
-                df[colname] = removechar(col, ",")
-                df[colname] = df[colname].astype(int)
-            elif colname in ["Grosses", "GrossesPrev Week"]:
-                col = removechar(col, "$")
-                df[colname] = col
-                df[colname] = removechar(col, ",")
-                df[colname] = df[colname].astype(int)
-            #elif colname in ["Theatre", "Type"]:
-            elif colname == "Week End":
-                df[colname] = [datetime.strptime(row, "%m/%d/%Y") for row in df[colname]]
-
-        colmapping = {"#Perf": "nshows",
-                      "#Prev": "nprevs",
-                      "% Cap": "capacity",
-                      "Attend": "nsold",
-                      "AttendPrev Week": "nsold_previous",
-                      "GG%GP": "perc_gp",
-                      "Grosses": "gross",
-                      "GrossesPrev Week": "gross_previous",
-                      "Show": "show",
-                      "Theatre": "theater",
-                      "Type": "showtype",
-                      "Week End": "enddate"}
-        df2 = df.rename(columns=colmapping)
+        with span("convert_columns", url=url):
+            df2 = convert_columns(df)
+        show_href = "Show" + HREF_SUFFIX
+        if show_href in df2.columns:
+            df2["link"] = get_link(df2.pop(show_href))
         
         df2["totalshows"] = df2["nshows"] + df2["nprevs"]
         return cls(df2)
 
-    def plot_grosses(self):
+    @classmethod
+    def from_store(cls, root=STORE_DIR, columns=None, start=None, end=None):
+        """
+        Instantiate the class from a store written by ingest. Weeks outside
+        the date range are pruned by partition name, and nothing is read
+        until data is first accessed.
+
+        Args:
+            root (str): Store directory.
+            columns (list or None): Columns to load, all if None.
+            start (str, datetime or None): First week-ending date to load.
+            end (str, datetime or None): Last week-ending date to load.
+        """
+        weeks = stored_weeks(root, start, end)
+        files = [os.path.join(root, PARTITION.format(week), PART_FILE) for week in weeks]
+        return cls(loader=lambda: _read_parts(files, columns))
+
+    def weekly(self):
+        """
+        Per-row derived metrics, one row per show and week. Memoized; the
+        result is shared between calls, so do not modify it.
+
+        Returns:
+            weekly (:obj:`pandas.DataFrame`): show, theater and enddate,
+                with avg_price (gross per ticket sold), pershow (gross per
+                performance), gross_change, nsold_change (differences with
+                the previous week) and gross_change_pct, nsold_change_pct
+                (as fractions of the previous week). Ratios with a zero
+                denominator are NaN.
+        """
+        return self._memo(("weekly",), self._weekly)
+
+    def _weekly(self):
+        df = self.data
+        weekly = pd.DataFrame({"show": df["show"],
+                               "theater": df["theater"],
+                               "enddate": df["enddate"]}, index=df.index)
+        weekly["avg_price"] = df["gross"] / df["nsold"].where(df["nsold"] != 0)
+        weekly["pershow"] = df["gross"] / df["totalshows"].where(df["totalshows"] != 0)
+        for col in ("gross", "nsold"):
+            previous = df[col + "_previous"]
+            weekly[col + "_change"] = df[col] - previous
+            weekly[col + "_change_pct"] = weekly[col + "_change"] / previous.where(previous != 0)
+        return weekly
+
+    def summary(self, by="show"):
+        """
+        Aggregates over all weeks, per show or per theater. Memoized; the
+        result is shared between calls, so do not modify it.
+
+        Args:
+            by (str): "show" or "theater".
+        Returns:
+            summary (:obj:`pandas.DataFrame`): Indexed by show or theater,
+                with the number of weeks, total and mean gross, tickets
+                sold, avg_price (total gross over total tickets sold),
+                mean capacity, and mean week-over-week gross_change and
+                nsold_change. Sorted by decreasing total gross.
+        """
+        return self._memo(("summary", by), lambda: self._summary(by))
+
+    def _summary(self, by):
+        df = self.data
+        weekly = self.weekly()
+        frame = pd.DataFrame({by: df[by], "enddate": df["enddate"],
+                              "gross": df["gross"], "nsold": df["nsold"],
+                              "capacity": df["capacity"],
+                              "gross_change": weekly["gross_change"],
+                              "nsold_change": weekly["nsold_change"]})
+        summary = frame.groupby(by).agg(weeks=("enddate", "nunique"),
+                                        gross=("gross", "sum"),
+                                        mean_gross=("gross", "mean"),
+                                        nsold=("nsold", "sum"),
+                                        capacity=("capacity", "mean"),
+                                        gross_change=("gross_change", "mean"),
+                                        nsold_change=("nsold_change", "mean"))
+        summary.insert(4, "avg_price", summary["gross"] / summary["nsold"].where(summary["nsold"] != 0))
+        return summary.sort_values("gross", ascending=False)
+
+    def capacity_trend(self, by="show"):
+        """
+        Least-squares trend of the capacity filled, per show or theater.
+        Memoized; the result is shared between calls, so do not modify it.
+
+        Args:
+            by (str): "show" or "theater".
+        Returns:
+            trend (:obj:`pandas.DataFrame`): Indexed by show or theater,
+                with the number of weeks, first and last week-ending
+                dates, mean capacity and slope, the change in capacity
+                per week (NaN with a single week).
+        """
+        return self._memo(("capacity_trend", by), lambda: self._capacity_trend(by))
+
+    def _capacity_trend(self, by):
+        df = self.data
+        # Mean capacity of each group and week, e.g. for theaters with
+        # several shows in a week.
+        weekly = df.groupby([by, "enddate"], as_index=False)["capacity"].mean()
+        x = (weekly["enddate"] - weekly["enddate"].min()) / pd.Timedelta(weeks=1)
+        groups = weekly.groupby(by)
+        dx = x - x.groupby(weekly[by]).transform("mean")
+        dy = weekly["capacity"] - groups["capacity"].transform("mean")
+        frame = pd.DataFrame({by: weekly[by], "dxdy": dx*dy, "dxdx": dx*dx})
+        sums = frame.groupby(by)[["dxdy", "dxdx"]].sum()
+        trend = groups.agg(weeks=("capacity", "size"),
+                           first=("enddate", "min"),
+                           last=("enddate", "max"),
+                           capacity=("capacity", "mean"))
+        trend["slope"] = sums["dxdy"] / sums["dxdx"].where(sums["dxdx"] != 0)
+        return trend
+
+    def rankings(self, metric="gross", by="show"):
+        """
+        Rank shows or theaters within each week. Memoized; the result is
+        shared between calls, so do not modify it.
+
+        Args:
+            metric (str): Column of data, or of weekly(), to rank by, e.g.
+                "gross", "nsold", "capacity" or "avg_price". Highest is
+                ranked 1.
+            by (str): "show" or "theater". Theaters are ranked by the sum
+                of their shows' metric, or its mean for capacity and the
+                ratios from weekly().
+        Returns:
+            rankings (:obj:`pandas.DataFrame`): enddate, show or theater,
+                metric and rank, sorted by week and rank.
+        """
+        return self._memo(("rankings", metric, by), lambda: self._rankings(metric, by))
+
+    def _rankings(self, metric, by):
+        df = self.data
+        if metric in df.columns:
+            values = df[metric]
+            summed = metric not in ("capacity", "perc_gp")
+        else:
+            values = self.weekly()[metric]
+            summed = False
+        frame = pd.DataFrame({"enddate": df["enddate"], by: df[by], metric: values})
+        if by != "show":
+            grouped = frame.groupby(["enddate", by], as_index=False)[metric]
+            frame = grouped.sum() if summed else grouped.mean()
+        frame["rank"] = (frame.groupby("enddate")[metric]
+                         .rank(ascending=False, method="min").astype("Int64"))
+        return frame.sort_values(["enddate", "rank"], ignore_index=True)
+
+    def _memo(self, key, compute):
+        """
+        Return the memoized result for key, computing it on first use. The
+        memo is dropped if data is no longer the same object of the same
+        shape, a check that costs nothing next to recomputing.
+        """
+        df = self.data
+        if (id(df), df.shape) != self._key:
+            self._cache = {}
+            self._key = (id(df), df.shape)
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def plot_grosses(self, outfile="grosses.html", auto_open=True,
+                     max_points=MAX_SVG_POINTS, include_plotlyjs=True):
         """
         Plot the gross and scaled gross values (gross per show) as a
-        function of show, for one given week.
-        """
-        fig = go.Figure()
-        trace0 = go.Scatter(x=self.data["show"], y=self.data["gross"],
-                            mode="markers+lines",
-                            line=dict(color="royalblue", width=4),
-                            marker=dict(size=12),
-                            name="Gross")
-        factor = np.average(self.data["gross"])/np.average(self.data["totalshows"])
-        trace1 = go.Scatter(x=self.data["show"], 
-                            y=self.data["gross"]/self.data["totalshows"],
-                            mode="markers+lines",
-                            line=dict(color="mediumorchid", width=4),
-                            marker=dict(size=12),
-                            name="Gross/Show (Scaled)")
-        data = [trace0, trace1]
+        function of show, for one given week. Above max_points rows, e.g.
+        when data spans many weeks, rows are averaged per show (and evenly
+        thinned if still too many) and drawn with WebGL traces, so the
+        HTML stays small and fast to render.
+
+        Args:
+            outfile (str): Output HTML file.
+            auto_open (Bool): If True, open the plot in a browser.
+            max_points (int): Largest number of rows plotted as-is with SVG
+                traces.
+            include_plotlyjs (Bool or str): Passed to write_html; True
+                embeds plotly.js so the file is self-contained.
+        Returns:
+            outfile (str): Output HTML file.
+        """
+        with span("plot_grosses", rows=len(self.data)):
+            import numpy as np
+            import plotly.graph_objects as go
+            df = pd.DataFrame({"show": self.data["show"],
+                               "gross": self.data["gross"],
+                               "pershow": self.data["gross"]/self.data["totalshows"]})
+            scatter = go.Scatter
+            if len(df) > max_points:
+                scatter = go.Scattergl
+                df = df.groupby("show", sort=False, as_index=False).mean()
+                if len(df) > max_points:
+                    keep = np.linspace(0, len(df)-1, max_points).astype(int)
+                    df = df.iloc[keep]
+
+            trace0 = scatter(x=df["show"], y=df["gross"],
+                             mode="markers+lines",
+                             line=dict(color="royalblue", width=4),
+                             marker=dict(size=12),
+                             name="Gross")
+            trace1 = scatter(x=df["show"], 
+                             y=df["pershow"],
+                             mode="markers+lines",
+                             line=dict(color="mediumorchid", width=4),
+                             marker=dict(size=12),
+                             name="Gross/Show (Scaled)")
+            data = [trace0, trace1]
     
-        fontd = {"family":"Courier New, monospace",
-                 "size":18,
-                 "color":"#7f7f7f"}
-        layout = go.Layout(title="Gross",
-                           xaxis_title="Show",
-                           yaxis_title="Gross [$]")
+            fontd = {"family":"Courier New, monospace",
+                     "size":18,
+                     "color":"#7f7f7f"}
+            layout = go.Layout(title="Gross",
+                               xaxis_title="Show",
+                               yaxis_title="Gross [$]")
     #                       xaxis=dict(text="Show", font=dict(),
     #                       yaxis=dict(text="Gross [$]", font=fontd))
-        
-        fig = go.Figure(data=data, layout=layout)
-        fig.write_html("grosses.html", auto_open=True)
+
+            fig = go.Figure(data=data, layout=layout)
+            fig.write_html(outfile, auto_open=auto_open,
+                           include_plotlyjs=include_plotlyjs)
+            return outfile
 
 #-----------------------------------------------------------------------------#        
-def removechar(arr, char):
-    """ Remove a string character from each element in an array. """
-    striparr = [row.replace(char, "") for row in arr]
-    return striparr
-
-def get_link(arr):
-    """ Get URL link for each BSD tag object in an array. """
-    hyperlink = [row.find("a") for row in arr]
-    href = ["https://www.broadwayleague.com"+row["href"] for row in hyperlink]
-    
+def ingest(week_ends, root=STORE_DIR, url_template=BWAY_WEEK_URL,
+           concurrency=CONCURRENCY, overwrite=False):
+    """
+    Fetch the grosses of many weeks concurrently and write each week to
+    its own Parquet partition, root/enddate=YYYY-MM-DD/part.parquet.
+    Weeks already in the store are skipped unless overwrite is True.
+
+    Args:
+        week_ends (iterable): Week-ending dates (str or datetime).
+        root (str): Store directory.
+        url_template (str): URL of one week's grosses, formatted with the
+            week-ending date.
+        concurrency (int): Maximum number of weeks fetched at the same time.
+        overwrite (Bool): If True, fetch and rewrite weeks already stored.
+    Returns:
+        written (list): Week-ending dates written, as datetime.date.
+    """
+    weeks = sorted({pd.Timestamp(week).date() for week in week_ends})
+    if not overwrite:
+        stored = set(stored_weeks(root))
+        weeks = [week for week in weeks if week not in stored]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(_ingest_week, root, url_template, week): week
+                   for week in weeks}
+        for future in as_completed(futures):
+            future.result()
+    return weeks
+
+def stored_weeks(root=STORE_DIR, start=None, end=None):
+    """
+    List the week-ending dates in a store from its partition names alone.
+
+    Args:
+        root (str): Store directory.
+        start (str, datetime or None): Earliest date to include.
+        end (str, datetime or None): Latest date to include.
+    Returns:
+        weeks (list): Sorted datetime.date of each stored week.
+    """
+    if not os.path.isdir(root):
+        return []
+    start = pd.Timestamp(start).date() if start is not None else None
+    end = pd.Timestamp(end).date() if end is not None else None
+    weeks = []
+    prefix = PARTITION.split("{")[0]
+    for entry in os.scandir(root):
+        if not entry.name.startswith(prefix):
+            continue
+        week = datetime.strptime(entry.name[len(prefix):], "%Y-%m-%d").date()
+        if (start is None or week >= start) and (end is None or week <= end):
+            weeks.append(week)
+    return sorted(weeks)
+
+def _ingest_week(root, url_template, week):
+    """ Fetch one week and write its partition. Runs in a worker thread. """
+    # Past weeks never change, so never revalidate them.
+    url = url_template.format(week)
+    df = BwayData.from_url(url, ttl=None).data
+    # A site that ignores the week in the URL serves the current week instead.
+    if len(df) == 0 or not (df["enddate"].dt.date == week).all():
+        raise ValueError("{} is not the grosses of the week ending {}".format(url, week))
+    _write_week(root, week, df)
+
+def _write_week(root, week, df):
+    """ Write the partition of one week, leaving none behind on failure. """
+    partition = os.path.join(root, PARTITION.format(week))
+    os.makedirs(partition, exist_ok=True)
+    # Write then rename, so a partition is never seen half-written.
+    tmp = os.path.join(partition, PART_FILE + ".tmp")
+    try:
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, os.path.join(partition, PART_FILE))
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        if not os.listdir(partition):
+            os.rmdir(partition)
+        raise
+
+def _read_parts(files, columns):
+    """ Read and concatenate Parquet partitions. """
+    if len(files) == 0:
+        return pd.DataFrame(columns=columns)
+    parts = [pd.read_parquet(f, columns=columns) for f in files]
+    return pd.concat(parts, ignore_index=True)
+
+def convert_columns(df, schema=COLUMN_SCHEMA):
+    """
+    Convert the raw text columns of a grosses table to their types and
+    rename them, using vectorized pandas string and datetime operations.
+    Columns not in the schema are passed through untouched.
+
+    Args:
+        df (:obj:`pandas.DataFrame`): Table of strings, as parsed from HTML.
+        schema (dict): Maps raw column names to (new name, type), where
+            type is a key of CONVERTERS.
+    Returns:
+        converted (:obj:`pandas.DataFrame`): Typed and renamed table.
+    """
+    converted = {}
+    for colname in df.columns:
+        if colname not in schema:
+            converted[colname] = df[colname]
+            continue
+        newname, coltype = schema[colname]
+        converted[newname] = CONVERTERS[coltype](df[colname])
+    return pd.DataFrame(converted, index=df.index)
+
+def _to_int(col):
+    return col.astype("int64")
+
+def _to_percent(col):
+    return col.str.replace("%", "", regex=False).astype(float) / 100.
+
+def _to_thousands(col):
+    return col.str.replace(",", "", regex=False).astype("int64")
+
+def _to_currency(col):
+    return col.str.replace(r"[$,]", "", regex=True).astype("int64")
+
+def _to_date(col):
+    return pd.to_datetime(col, format="%m/%d/%Y")
+
+def _to_text(col):
+    return col
+
+CONVERTERS = {"int": _to_int,
+              "percent": _to_percent,
+              "thousands": _to_thousands,
+              "currency": _to_currency,
+              "date": _to_date,
+              "text": _to_text}
+
+def get_link(arr, base=BWAY_SITE):
+    """ Get the full URL of each (possibly relative) link in an array. """
+    href = [urljoin(base, row) if isinstance(row, str) else None for row in arr]
+    return href
+
+#-----------------------------------------------------------------------------#
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--store", default=STORE_DIR,
+                        help="Parquet store directory (default: {})".format(STORE_DIR))
+    parser.add_argument("--profile", default=None, metavar="REPORT",
+                        help="Record per-stage timing and memory, and write "
+                        "a JSON report to REPORT (- for stderr)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    fetch_cmd = commands.add_parser("fetch", help="Store the current week's grosses")
+    fetch_cmd.add_argument("--url", default=BWAY_LEAGUE,
+                           help="Grosses page (default: {})".format(BWAY_LEAGUE))
+    ingest_cmd = commands.add_parser("ingest", help="Store the grosses of past weeks")
+    ingest_cmd.add_argument("--start", required=True,
+                            help="First week-ending date (a Sunday), e.g. 2019-01-06")
+    ingest_cmd.add_argument("--end", default=None,
+                            help="Last week-ending date (default: start)")
+    ingest_cmd.add_argument("--url-template", default=BWAY_WEEK_URL,
+                            help="Grosses page of one week, formatted with "
+                            "its week-ending date (default: {})".format(BWAY_WEEK_URL.replace("%", "%%")))
+    ingest_cmd.add_argument("-j", dest="concurrency", type=int, default=CONCURRENCY,
+                            help="Maximum number of weeks fetched at the same time")
+    ingest_cmd.add_argument("--overwrite", action="store_true",
+                            help="Fetch weeks even if they are already stored")
+    plot_cmd = commands.add_parser("plot", help="Plot stored grosses")
+    plot_cmd.add_argument("--start", default=None, help="First week-ending date")
+    plot_cmd.add_argument("--end", default=None, help="Last week-ending date")
+    plot_cmd.add_argument("-o", dest="outfile", default="grosses.html",
+                          help="Output HTML file")
+    plot_cmd.add_argument("--open", dest="auto_open", action="store_true",
+                          help="Open the plot in a browser")
+    args = parser.parse_args()
+    if args.profile is not None:
+        instrument.enable(args.profile)
+
+    if args.command == "fetch":
+        df = BwayData.from_url(args.url).data
+        week = df["enddate"].iloc[0].date()
+        _write_week(args.store, week, df)
+        print("Stored week ending {} in {}".format(week, args.store))
+    elif args.command == "ingest":
+        end = args.end if args.end is not None else args.start
+        weeks = pd.date_range(args.start, end, freq="W-SUN")
+        written = ingest(weeks, args.store, args.url_template, args.concurrency,
+                         args.overwrite)
+        print("Stored {} of {} weeks in {}".format(len(written), len(weeks), args.store))
+    else:
+        bway = BwayData.from_store(args.store, start=args.start, end=args.end)
+        outfile = bway.plot_grosses(args.outfile, auto_open=args.auto_open)
+        print("Wrote {}".format(outfile))
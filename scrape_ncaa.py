@@ -5,7 +5,12 @@ Scrape the ESPN website to get all NCAA Men's Basketball rankings from week 1
 to the current week. Produce diagnostic pltos of rankings vs. time.
 
 Usage:
-    python scrape_ncaa.py
+    python scrape_ncaa.py [all|fetch|compile|plot] [--store ncaa_rankings.sqlite] [--seasons 2010-2019]
+
+fetch only scrapes into the store, compile prints a summary of the stored
+rankings and plot draws them without touching the network; all (the
+default) does everything in one go. Plotting and array libraries are only
+imported by the commands that need them.
 '''
 
 __author__ = "Jo Taylor"
@@ -13,23 +18,61 @@ __date__ = "03-01-2017"
 __maintainer__ = "Jo Taylor"
 __email__ = "jotaylor@stsci.edu"
 
-import matplotlib.pyplot as pl
-pl.style.use("ggplot")
-import numpy as np
-from bs4 import BeautifulSoup
-import requests
+# matplotlib, numpy (through ncaa_ranks) and bs4 are imported where they
+# are used, so that e.g. a fetch-only run does not pay for them.
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from fetch import fetch, DEFAULT_TTL, RETRIES
+from HTMLTableParser import HTMLTableParser
+import instrument
+from instrument import span, bind
+from ncaa_store import RankingStore, STORE_FILE
+
+ESPN_RANKINGS = "http://www.espn.com/mens-college-basketball/rankings"
+SEASON_URL = "{0}/_/year/{1}"
+WEEK_URL = "{0}/_/year/{1}/week/{2}/"
+# Maximum number of weekly pages fetched at the same time.
+CONCURRENCY = 6
+# Content hashes of the rank series behind each saved figure.
+PLOT_MANIFEST = ".rank_v_time.json"
+# Title in the first row of each poll's table -> poll.
+POLL_TITLES = {"AP Top 25": "ap",
+               "USA Today Coaches Poll": "usa"}
+# Command line stages; all is the default.
+COMMANDS = ("all", "fetch", "compile", "plot")
+
+# pyplot, once _pyplot has imported it.
+_pl = None
 
 #-----------------------------------------------------------------------------# 
 #-----------------------------------------------------------------------------# 
 
-def parse_espn():
+def parse_espn(url=ESPN_RANKINGS, concurrency=CONCURRENCY, timeout=30,
+               retries=RETRIES, store=None):
     '''
     Get the HTML source code from ESPN and gather the rankings from the AP
-    Top 25 and USA Today Coaches Poll.
+    Top 25 and USA Today Coaches Poll. The current rankings page gives the
+    season and latest week; all earlier weeks are then fetched and parsed
+    concurrently. If a store is given, only the latest week and weeks
+    missing from it, or stored before all their polls were out, are
+    fetched, and the whole season is read back from the store.
 
     Parameters:
     -----------
-        None
+        url : str
+            URL of the current rankings page.
+        concurrency : int
+            Maximum number of weeks fetched at the same time.
+        timeout : float
+            Timeout of each request in seconds.
+        retries : int
+            Number of retries, with exponential backoff, of each request.
+        store : ncaa_store.RankingStore or None
+            Persistent store of previously scraped weeks.
 
     Returns:
     --------
@@ -39,17 +82,125 @@ def parse_espn():
             Year of season of interest.
     '''
     
-    # The current rankings should always be at this URL.
-    url = "http://www.espn.com/mens-college-basketball/rankings"
-    r = requests.get(url)
-    data = r.text
-    soup = BeautifulSoup(data, "html.parser")
+    with span("parse_espn", url=url):
+        # The current rankings should always be at this URL.
+        html = _fetch_page(url, DEFAULT_TTL, timeout, retries)
+        season, final_week = parse_header(html)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            pending = _submit_season(pool, url, season, final_week, html, store,
+                                     timeout, retries)
+            espn_dict = _collect_season(season, final_week, pending, store)
+
+    return espn_dict, season
+
+def backfill(seasons, url=ESPN_RANKINGS, concurrency=CONCURRENCY, timeout=30,
+             retries=RETRIES, store=None):
+    '''
+    Get the rankings of several past seasons. All pages of all seasons
+    share one thread pool, so concurrency is a global limit. The landing
+    page of each season gives its final week.
+
+    Parameters:
+    -----------
+        seasons : iterable
+            Years of the seasons of interest.
+        url : str
+            URL of the current rankings page.
+        concurrency : int
+            Maximum number of pages fetched at the same time.
+        timeout : float
+            Timeout of each request in seconds.
+        retries : int
+            Number of retries, with exponential backoff, of each request.
+        store : ncaa_store.RankingStore or None
+            Persistent store of previously scraped weeks.
+
+    Returns:
+    --------
+        season_dicts : dictionary
+            {season: espn_dict} for each season, ready for compile_seasons.
+    '''
+    seasons = [str(season) for season in seasons]
+    with span("backfill", seasons=len(seasons)):
+        pending = {}
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            landing = {pool.submit(bind(_fetch_page), SEASON_URL.format(url, season),
+                                   DEFAULT_TTL, timeout, retries): season
+                       for season in seasons}
+            for future in as_completed(landing):
+                season = landing[future]
+                html = future.result()
+                final_week = parse_header(html)[1]
+                pending[season] = (final_week,
+                                   _submit_season(pool, url, season, final_week, html,
+                                                  store, timeout, retries))
+            season_dicts = {}
+            for season in seasons:
+                final_week, weeks = pending[season]
+                season_dicts[season] = _collect_season(season, final_week, weeks, store)
+
+        return season_dicts
+
+def _submit_season(pool, url, season, final_week, html, store, timeout, retries):
+    '''
+    Queue the weeks of a season that are missing from the store (all weeks
+    without a store), or stored with a poll that had no rankings yet. The
+    final week is always parsed again from the page already in hand, html.
+    '''
+    stored = store.weeks(season) if store is not None else set()
+    complete = store.weeks(season, complete=True) if store is not None else set()
+    pending = {}
+    # Work backwards from the final week to week 1.
+    for week in range(final_week, 0, -1):
+        if week == final_week:
+            pending[week] = pool.submit(bind(_parse_week), html, season, week)
+        elif week not in complete:
+            # Past weeks never change, so are never revalidated, unless
+            # the cached page was missing a poll.
+            ttl = DEFAULT_TTL if week in stored else None
+            pending[week] = pool.submit(bind(_fetch_week), url, season, week, ttl,
+                                        timeout, retries)
+    return pending
+
+def _collect_season(season, final_week, pending, store):
+    '''
+    Wait for a season's queued weeks and assemble its espn_dict, through
+    the store if there is one.
+    '''
+    polls = {week: future.result() for week, future in pending.items()}
+    if store is not None:
+        for week in sorted(polls):
+            store.put_week(season, week, polls[week])
+        return store.load(season)
 
     # Initialize dictionary.    
     espn_dict = {"ap": {},
                  "usa": {} } 
+    for week in range(final_week, 0, -1):
+        for poll in espn_dict:
+            espn_dict[poll][week] = polls[week][poll]
+    return espn_dict
 
+def parse_header(html):
+    '''
+    Get the season and latest week from the header of a rankings page.
+
+    Parameters:
+    -----------
+        html : str
+            Source of the rankings page.
+
+    Returns:
+    --------
+        season : str
+            Year of season of interest.
+        final_week : int
+            Latest week with rankings.
+    '''
+    from bs4 import BeautifulSoup, SoupStrainer
     # Get the header of the webpage, which describes the current year (season)
+    soup = BeautifulSoup(html, "html.parser", parse_only=SoupStrainer("h1"))
     h1 = soup.find("h1")
     header = h1.get_text()
     words = header.split()
@@ -61,157 +212,257 @@ def parse_espn():
         final_week = "18"
     else:
         final_week = words[words.index("Week") + 1]
-   
-    # Work backwards from the final week to week 1
-    for week in np.arange(1, int(final_week)+1)[::-1]:
-        espn_dict["ap"][week] = {}
-        espn_dict["usa"][week] = {}
-        if week != final_week:
-            # For all weeks not the one we started at, change the URL
-            # and get HTML text
-            url = "http://www.espn.com/mens-college-basketball/rankings/_/year/{0}/week/{1}/".format(season, week)
-            r = requests.get(url)
-            data = r.text
-            soup = BeautifulSoup(data)
-        
-        # Get the HTML tables (there should be 2, one for each poll).
-        all_tables = soup.find_all("table")
-        for table in all_tables:
-            # Get all rows from the table
-            rows = table.find_all("tr")
-            for i in range(len(rows)):
-                cols = rows[i].find_all("td")
-                # The first row contains the poll information.
-                if i == 0:
-                    polltype = cols[0].get_text()
-                    if polltype == "AP Top 25":
-                        poll = "ap"
-                    elif polltype == "USA Today Coaches Poll":
-                        poll = "usa"
-                # The second row contains the Column names, which we don't want
-                elif i == 1:
+    return season, int(final_week)
+
+def parse_polls(html):
+    '''
+    Gather the rank, team, and record of each poll on one week's page.
+    Only the poll tables are parsed, and parsing stops after the last one.
+
+    Parameters:
+    -----------
+        html : str
+            Source of the rankings page.
+
+    Returns:
+    --------
+        polls : dictionary
+            {"ap": {"rank": [...], "team": [...], "record": [...]},
+             "usa": ...}
+    '''
+    polls = {"ap": {},
+             "usa": {} }
+    # Get the HTML tables (there should be 2, one for each poll). The
+    # first row contains the poll information, so rows are kept as-is.
+    H = HTMLTableParser.from_html(html, engine="stream", header=False,
+                                  select=lambda title: any(name in title for name in POLL_TITLES),
+                                  limit=len(POLL_TITLES))
+    for table in H.tables:
+        rows = table.values
+        poll = POLL_TITLES.get(rows[0][0])
+        if poll is None:
+            continue
+        # The second row contains the Column names, which we don't want
+        for cols in rows[2:]:
+            if "No rankings available" in cols[0]:
+                nodata = True
+            else:
+                nodata = False
+            # Get the rank, team, and season record 
+            for ind, key in enumerate(["rank","team","record"]):
+                if not key in polls[poll].keys():
+                    polls[poll][key] = []
+                if nodata is True:
+                    polls[poll][key].append(0)
                     continue
-                else:
-                    if "No rankings available" in cols[0].get_text():
-                        nodata = True
-                    else:
-                        nodata = False
-                    # Get the rank, team, and season record 
-                    for ind, key in enumerate(["rank","team","record"]):
-                        if not key in espn_dict[poll][week].keys():
-                            espn_dict[poll][week][key] = []
-                        if nodata is True:
-                            espn_dict[poll][week][key].append(0)
-                            continue
-                        # Need to do split and strip on result to ensure you
-                        # get full team name (e.g. Notre Dame)
-                        colval = cols[ind].get_text()
-                        keyval = colval.split("(")[0].strip()
-                        if key == "rank":
-                            keyval = int(keyval)
-                        espn_dict[poll][week][key].append(keyval)
+                # Need to do split and strip on result to ensure you
+                # get full team name (e.g. Notre Dame)
+                colval = cols[ind]
+                keyval = colval.split("(")[0].strip()
+                if key == "rank":
+                    keyval = int(keyval)
+                polls[poll][key].append(keyval)
+    return polls
 
-    return espn_dict, season
+def _fetch_week(url, season, week, ttl, timeout, retries):
+    '''
+    Fetch and parse the rankings of one past week. Runs in a worker thread.
+    '''
+    with span("parse_espn.week", season=season, week=week):
+        week_url = WEEK_URL.format(url, season, week)
+        return parse_polls(_fetch_page(week_url, ttl, timeout, retries))
+
+def _parse_week(html, season, week):
+    '''
+    Parse the rankings of the week already in hand. Runs in a worker thread.
+    '''
+    with span("parse_espn.week", season=season, week=week):
+        return parse_polls(html)
+
+def _fetch_page(url, ttl, timeout, retries):
+    '''
+    Fetch the source of one page. Runs in a worker thread.
+    '''
+    r = fetch(url, ttl=ttl, timeout=timeout, retries=retries)
+    return r.text
 
 #-----------------------------------------------------------------------------# 
 #-----------------------------------------------------------------------------# 
 
-def plot_rank_v_week(team_dict, season, save):
+def plot_rank_v_week(team_ranks, season, save, outdir=".", workers=None,
+                     force=False, dpi=200):
     '''
     Plot the rank vs. week for each team that is ranked at least once during
-    the season.
+    the season. When saving, the figures are rendered with the Agg backend
+    across a process pool, and teams whose rank series are unchanged since
+    their PNG was last saved are skipped.
 
     Paramaters:
     -----------
-        team_dict : dictionary
-            Dictionary describing teams as a function of rank.
+        team_ranks : RankMatrix
+            Ranks as a function of poll, team, and week.
         season : str
             Year of season of interest.
         save : Bool
             Switch to save figure.
+        outdir : str
+            Directory to save figures in.
+        workers : int or None
+            Number of rendering processes, defaults to the number of CPUs.
+            1 renders in this process.
+        force : Bool
+            Switch to render every team, even if unchanged.
+        dpi : int
+            Resolution of saved figures.
 
     Returns:
     --------
         None
     '''
 
-    for team in team_dict["ap"].keys():
-        fig, ax = pl.subplots(figsize=(9, 6))
-        ap_ranks = team_dict["ap"][team]["ranks"]
-        ap_weeks = team_dict["ap"][team]["weeks"]
-        ax.plot(ap_weeks, ap_ranks, "o-", color="royalblue", label="AP")
-        # The AP and USA polls differ sometimes, so check if team is ranked in
-        # both polls.
-        try:
-            usa_ranks = team_dict["usa"][team]["ranks"]
-            usa_weeks = team_dict["usa"][team]["weeks"]
-        except KeyError:
-            pass    
-        # If the team is ranked in USA as well, plot both. Otherwise only plot
-        # AP poll. 
+    with span("plot_rank_v_week", season=season, save=save):
+        jobs = []
+        for team in team_ranks.ranked_teams("ap"):
+            ap_weeks, ap_ranks = team_ranks.series("ap", team)
+            usa_weeks, usa_ranks = team_ranks.series("usa", team)
+            jobs.append((str(season), str(team), ap_weeks.tolist(), ap_ranks.tolist(),
+                         usa_weeks.tolist(), usa_ranks.tolist()))
+
+        if not save:
+            pl = _pyplot()
+            for job in jobs:
+                fig = _draw_team(*job)
+                fig.show()
+                this = input("Press enter to continue")
+                pl.close(fig)
+            return
+
+        # Only render teams whose series changed since their PNG was saved.
+        manifest_file = os.path.join(outdir, PLOT_MANIFEST)
+        manifest = {}
+        if os.path.isfile(manifest_file):
+            with open(manifest_file) as f:
+                manifest = json.load(f)
+        todo = []
+        for job in jobs:
+            season_, team = job[:2]
+            figname = "{}_{}_rank_v_time.png".format(season_, team.replace(" ", ""))
+            digest = hashlib.sha1(json.dumps([job, dpi]).encode("utf-8")).hexdigest()
+            if (not force and manifest.get(figname) == digest
+                    and os.path.isfile(os.path.join(outdir, figname))):
+                continue
+            todo.append((job, os.path.join(outdir, figname), dpi))
+            manifest[figname] = digest
+        print("{0} of {1} figures changed".format(len(todo), len(jobs)))
+
+        os.makedirs(outdir, exist_ok=True)
+        if workers == 1 or len(todo) <= 1:
+            _use_agg()
+            saved = map(_render_team, todo)
         else:
-            ax.plot(usa_weeks, usa_ranks, "o-", color="mediumturquoise", label="USA")
-        
-        ax.set_ylim(26, -1)
-        ax.set_xlim(0, 19)
-        ax.legend(loc="best")
-        ax.set_xlabel("Week")
-        ax.set_ylabel("Rank")
-        ax.set_title("{0} {1} Rankings".format(season, team))
-        if save:
-            figname = "{}_{}_rank_v_time.png".format(season, team.replace(" ", ""))
-            fig.savefig(figname, bbox_inches="tight", dpi=200)
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_use_agg)
+            with pool:
+                saved = list(pool.map(_render_team, todo))
+        for figname in saved:
             print("Saved {0}".format(figname))
-        else:
-            fig.show()
-            this = input("Press enter to continue")
-        fig.clf()
+        with open(manifest_file, "w") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+
+def _draw_team(season, team, ap_weeks, ap_ranks, usa_weeks, usa_ranks):
+    '''
+    Draw one team's rank vs. week figure.
+    '''
+    fig, ax = _pyplot().subplots(figsize=(9, 6))
+    ax.plot(ap_weeks, ap_ranks, "o-", color="royalblue", label="AP")
+    # The AP and USA polls differ sometimes, so check if team is ranked in
+    # both polls. If the team is ranked in USA as well, plot both.
+    # Otherwise only plot AP poll. 
+    if len(usa_weeks) != 0:
+        ax.plot(usa_weeks, usa_ranks, "o-", color="mediumturquoise", label="USA")
+    
+    ax.set_ylim(26, -1)
+    ax.set_xlim(0, 19)
+    ax.legend(loc="best")
+    ax.set_xlabel("Week")
+    ax.set_ylabel("Rank")
+    ax.set_title("{0} {1} Rankings".format(season, team))
+    return fig
+
+def _render_team(task):
+    '''
+    Draw, save and close one team's figure. Runs in a worker process.
+    '''
+    job, figname, dpi = task
+    fig = _draw_team(*job)
+    fig.savefig(figname, bbox_inches="tight", dpi=dpi)
+    # Closing removes the figure from pyplot's registry, so memory stays flat.
+    _pyplot().close(fig)
+    return figname
+
+def _pyplot():
+    '''
+    Import pyplot, with the ggplot style, the first time a figure is drawn.
+    '''
+    global _pl
+    if _pl is None:
+        import matplotlib.pyplot as pl
+        pl.style.use("ggplot")
+        _pl = pl
+    return _pl
+
+def _use_agg():
+    '''
+    Render without a display. Also the initializer of worker processes.
+    '''
+    _pyplot().switch_backend("Agg")
 
 #-----------------------------------------------------------------------------# 
 #-----------------------------------------------------------------------------# 
 
-def compile_team_info(espn_dict):
+def compile_team_info(espn_dict, season=""):
     '''
-    Take the output from parse_espn, and create a new dictionary that describes
-    ranks as a function of week for each team ranked at least once during the
-    season, for each poll. 
-    E.g. {"ap": {"indiana": [1,1,1,1,1], "purdue": [25,30,30,30,30],...},
-          "usa": ...}
+    Take the output from parse_espn, and build a RankMatrix that holds the
+    rank of every team ranked at least once during the season, as a
+    function of poll and week. Weeks a team was not ranked hold
+    ncaa_ranks.UNRANKED.
     
     Parameters:
     -----------
         espn_dict : dictionary
             Dictionary describing rankings as a function of poll.
+        season : str
+            Year of season of interest.
+    
+    Returns:
+    --------
+        team_ranks : RankMatrix
+            Ranks as a function of poll, team, and week.
+    '''
+    
+    from ncaa_ranks import RankMatrix
+    with span("compile_team_info", season=season):
+        return RankMatrix.from_espn({season: espn_dict})                    
+
+def compile_seasons(season_dicts):
+    '''
+    Build one RankMatrix across several seasons, e.g. from backfill. Use
+    RankMatrix.select_season to get a single season back.
+    
+    Parameters:
+    -----------
+        season_dicts : dictionary
+            {season: espn_dict}, with espn_dict as returned by parse_espn.
     
     Returns:
     --------
-        team_dict : dictionary
-            Dictionary describing teams as a function of rank.
+        team_ranks : RankMatrix
+            Ranks as a function of poll, team, and week of every season.
     '''
     
-    from collections import defaultdict
-
-    # Initialize dictionary.
-    team_dict = {}
-    for poll in espn_dict.keys():
-        # Create dictionary for each poll (ap vs usa).
-        team_dict[poll] = {}
-
-        # Loop over each week in espn_dict and get all teams that were ranked.
-        for week in espn_dict[poll].keys():
-            teams = espn_dict[poll][week]["team"]
-            ranks = espn_dict[poll][week]["rank"]
-            
-            # Loop over teams that in espn_dict.
-            for i in range(len(teams)):
-                # If team not ranked, add it to team_dict and fill in previous
-                # weeks (if not week 1) with "unranked", which I call rank=30.
-                if teams[i] not in team_dict[poll].keys():
-                    team_dict[poll][teams[i]] = defaultdict(list)
-                team_dict[poll][teams[i]]["weeks"].append(int(week))
-                team_dict[poll][teams[i]]["ranks"].append(ranks[i])
-
-    return team_dict                    
+    from ncaa_ranks import RankMatrix
+    with span("compile_seasons", seasons=len(season_dicts)):
+        return RankMatrix.from_espn(season_dicts)
 
 #-----------------------------------------------------------------------------# 
 #-----------------------------------------------------------------------------#
@@ -248,14 +499,94 @@ def print_indiana():
 
 
 
+def parse_seasons(text):
+    '''
+    Parse a season range ("2010-2019") or list ("2015,2017") into a list of
+    seasons.
+    '''
+    seasons = []
+    for part in text.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            seasons.extend(str(year) for year in range(int(first), int(last) + 1))
+        else:
+            seasons.append(part.strip())
+    return seasons
+
 #-----------------------------------------------------------------------------#
 #-----------------------------------------------------------------------------#
 
 if __name__ == "__main__":
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--store", nargs="?", const=STORE_FILE, default=None,
+                        help="SQLite store of scraped weeks; only weeks "
+                        "missing from it are fetched (default file: {}, "
+                        "always used by fetch, compile and plot)".format(STORE_FILE))
+    common.add_argument("--outdir", default=".",
+                        help="Directory to save figures in")
+    common.add_argument("-j", "--workers", type=int, default=None,
+                        help="Number of plotting processes (default: number of CPUs)")
+    common.add_argument("--force", action="store_true",
+                        help="Render every figure, even if its rankings are unchanged")
+    common.add_argument("--profile", default=None, metavar="REPORT",
+                        help="Record per-stage timing and memory, and write "
+                        "a JSON report to REPORT (- for stderr)")
+    common.add_argument("--seasons", type=parse_seasons, default=None,
+                        help="Backfill past seasons instead of scraping the "
+                        "current one, e.g. 2010-2019 or 2015,2017; for "
+                        "compile and plot, the stored seasons to use (default: all)")
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("all", parents=[common],
+                        help="Fetch, compile and plot (default)")
+    commands.add_parser("fetch", parents=[common],
+                        help="Only scrape new weeks into the store")
+    commands.add_parser("compile", parents=[common],
+                        help="Summarize the stored rankings")
+    commands.add_parser("plot", parents=[common],
+                        help="Plot the stored rankings")
+    argv = sys.argv[1:]
+    # No command means all, as before commands existed.
+    if not argv or argv[0] not in COMMANDS + ("-h", "--help"):
+        argv = ["all"] + argv
+    args = parser.parse_args(argv)
+    if args.profile is not None:
+        instrument.enable(args.profile)
+
     LINEOUT = "#-----------------------------------------------------------------------------#"
     print("{0}\n HOO HOO HOO HOOSIERS!\n{1}".format(LINEOUT, LINEOUT))
-    espn_dict, season = parse_espn()
-    team_dict = compile_team_info(espn_dict)
-    plot_rank_v_week(team_dict, season, True)
+    if args.command != "all" and args.store is None:
+        # Split stages hand their data over through the store.
+        args.store = STORE_FILE
+    store = RankingStore(args.store) if args.store is not None else None
+    if args.command in ("all", "fetch"):
+        if args.seasons is not None:
+            season_dicts = backfill(args.seasons, store=store)
+        else:
+            espn_dict, season = parse_espn(store=store)
+            season_dicts = {season: espn_dict}
+    else:
+        seasons = args.seasons if args.seasons is not None else store.seasons()
+        season_dicts = {season: store.load(season) for season in seasons}
+    if store is not None:
+        store.close()
+
+    if args.command == "fetch":
+        for season, espn_dict in season_dicts.items():
+            print("{0}: {1} weeks stored in {2}".format(season, len(espn_dict["ap"]), args.store))
+    elif args.command == "compile":
+        all_ranks = compile_seasons(season_dicts)
+        for season in season_dicts:
+            team_ranks = all_ranks.select_season(season)
+            print("{0}: {1} weeks, {2} teams ranked in the AP poll".format(
+                  season, len(team_ranks.weeks), len(team_ranks.ranked_teams("ap"))))
+            for team, season_, week, change in team_ranks.biggest_moves("ap", n=3):
+                print("    {0} moved {1:+d} in week {2}".format(team, change, week))
+    else:
+        all_ranks = compile_seasons(season_dicts)
+        for season in season_dicts:
+            team_ranks = all_ranks.select_season(season)
+            plot_rank_v_week(team_ranks, season, True, outdir=args.outdir,
+                             workers=args.workers, force=args.force)
     print(LINEOUT)
     #print_indiana()